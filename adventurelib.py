@@ -1,13 +1,24 @@
+import io
+import os
 import re
+import asyncio
 import sys
+import json
 import inspect
 try:
     import readline  # noqa: adds readline semantics to input()
 except ImportError:
     pass
+import signal
 import textwrap
 import random
+import functools
+import bisect
+import struct
 from copy import deepcopy
+from collections import OrderedDict, deque
+from types import MappingProxyType
+from contextlib import contextmanager, redirect_stdout
 try:
     from shutil import get_terminal_size
 except ImportError:
@@ -21,21 +32,41 @@ __version__ = '1.2.1'
 __all__ = (
     'when',
     'start',
+    'run_commands',
+    'start_async',
+    'start_server',
+    'save_command_table',
+    'load_command_table',
     'Room',
     'Item',
     'Bag',
+    'shortest_path',
+    'distances',
+    'reachable',
+    'connected_components',
     'say',
     'set_context',
     'get_context',
+    'Session',
+    'get_session',
+    'snapshot',
+    'restore',
+    'Journal',
 )
 
 
 #: The current context.
 #:
+#: This is the context of the active `Session`, and is updated whenever a
+#: different session becomes active.
+#:
 #: Commands will only be available if their context is "within" the currently
 #: active context, a functiondefined by '_match_context()`.
 current_context = None
 
+#: The interned `_ContextNode` for `current_context`.
+_current_node = None
+
 
 #: The separator that defines the context hierarchy
 CONTEXT_SEP = '.'
@@ -47,9 +78,11 @@ def set_context(new_context):
     Set the context to `None` to clear the context.
 
     """
-    global current_context
-    _validate_context(new_context)
+    global current_context, _current_node
+    node = _context_node(new_context)
+    _session.context_node = node
     current_context = new_context
+    _current_node = node
 
 
 def get_context():
@@ -80,6 +113,60 @@ def _validate_context(context):
         raise ValueError(msg.format(sep=CONTEXT_SEP, ctx=context))
 
 
+class _ContextNode:
+    """A context in the hierarchy of contexts, as interned by `_context_node()`.
+
+    `depth` is the number of dotted parts in the context, and `path` holds the
+    nodes for each of its ancestors from the outermost down, ending with the
+    node itself.
+
+    """
+    __slots__ = ('name', 'parent', 'depth', 'path')
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        if parent is None:
+            self.depth = 1
+            self.path = (self,)
+        else:
+            self.depth = parent.depth + 1
+            self.path = parent.path + (self,)
+
+    def __repr__(self):
+        return '<context %r>' % self.name
+
+    def within(self, active):
+        """Return True if the `active` node is within this one."""
+        return active is not None and (
+            active.depth >= self.depth and
+            active.path[self.depth - 1] is self
+        )
+
+
+#: Interned context nodes, by context string.
+_contexts = {}
+
+
+def _context_node(context):
+    """Return the interned node for a context string, or None for None.
+
+    The context is validated the first time it is seen.
+
+    """
+    if context is None:
+        return None
+    try:
+        return _contexts[context]
+    except KeyError:
+        pass
+    _validate_context(context)
+    parent_name, sep, _ = context.rpartition(CONTEXT_SEP)
+    parent = _context_node(parent_name) if sep else None
+    node = _contexts[context] = _ContextNode(context, parent)
+    return node
+
+
 def _match_context(context, active_context):
     """Return True if `context` is within `active_context`.
 
@@ -102,17 +189,9 @@ def _match_context(context, active_context):
         # If command has no context, it always matches
         return True
 
-    if active_context is None:
-        # If the command has a context, and we don't, no match
-        return False
-
-    # The active_context matches if it starts with context and is followed by
-    # the end of the string or the separator
-    clen = len(context)
-    return (
-        active_context.startswith(context) and
-        active_context[clen:clen + len(CONTEXT_SEP)] in ('', CONTEXT_SEP)
-    )
+    # The active context matches if the command's context is one of its
+    # ancestors, or the same context
+    return _context_node(context).within(_context_node(active_context))
 
 
 class InvalidCommand(Exception):
@@ -125,6 +204,8 @@ class InvalidDirection(Exception):
 
 class Placeholder:
     """Match a word in a command string."""
+    __slots__ = ('name',)
+
     def __init__(self, name):
         self.name = name
 
@@ -132,7 +213,37 @@ class Placeholder:
         return self.name.upper()
 
 
-class Room:
+class _RoomType(type):
+    """Metaclass for Room that gives each room its own copy of class Bags.
+
+    Bags in a class body are wrapped when the class is created, and Bags
+    assigned to the class later, including to Room itself, when they are set.
+
+    """
+
+    def __init__(cls, name, bases, namespace, **kwargs):
+        super().__init__(name, bases, namespace, **kwargs)
+        for k, v in list(namespace.items()):
+            if _is_bag(v):
+                type.__setattr__(cls, k, _RoomBag(k, v))
+
+    def __setattr__(cls, name, value):
+        if _is_bag(value):
+            value = _RoomBag(name, value)
+        super().__setattr__(name, value)
+
+
+def _is_bag(value):
+    """Return True if value is a Bag.
+
+    Room and its directions are set up before Bag is defined, but with values
+    that are not sets, so Bag is not looked up until it exists.
+
+    """
+    return isinstance(value, set) and isinstance(value, Bag)
+
+
+class Room(metaclass=_RoomType):
     """A generic room object that can be used by game code."""
 
     _directions = {}
@@ -161,14 +272,17 @@ class Room:
     def __init__(self, description):
         self.description = description.strip()
 
-        # Copy class Bags to instance variables
-        for k, v in vars(type(self)).items():
-            if isinstance(v, Bag):
-                setattr(self, k, deepcopy(v))
-
     def __str__(self):
         return self.description
 
+    def _exit_map(self):
+        """Get the dict mapping each direction of the room to its exit."""
+        # Looked up in __dict__ as subclasses may not call Room.__init__()
+        try:
+            return self.__dict__['_exits']
+        except KeyError:
+            return self.__dict__.setdefault('_exits', {})
+
     def exit(self, direction):
         """Get the exit of a room in a given direction.
 
@@ -177,38 +291,211 @@ class Room:
         """
         if direction not in self._directions:
             raise KeyError('%r is not a direction' % direction)
-        return getattr(self, direction, None)
+        return self._exit_map().get(direction)
 
     def exits(self):
         """Get a list of directions to exit the room."""
-        return sorted(d for d in self._directions if getattr(self, d))
+        return sorted(self._exit_map())
+
+    def _set_exit(self, direction, value):
+        """Set the exit in a direction, as an attribute and in the exit map."""
+        global _exits_version
+        _exits_version += 1
+        object.__setattr__(self, direction, value)
+        if value:
+            self._exit_map()[direction] = value
+        else:
+            self._exit_map().pop(direction, None)
 
     def __setattr__(self, name, value):
-        if isinstance(value, Room):
-            if name not in self._directions:
-                raise InvalidDirection(
-                    '%r is not a direction you have declared.\n\n' +
-                    'Try calling Room.add_direction(%r, <opposite>) ' % name +
-                    ' where <opposite> is the return direction.'
-                )
-            reverse = self._directions[name]
-            object.__setattr__(self, name, value)
-            object.__setattr__(value, reverse, self)
+        if name in self._directions:
+            self._set_exit(name, value)
+            if isinstance(value, Room):
+                value._set_exit(self._directions[name], self)
+        elif isinstance(value, Room):
+            raise InvalidDirection(
+                '%r is not a direction you have declared.\n\n' +
+                'Try calling Room.add_direction(%r, <opposite>) ' % name +
+                ' where <opposite> is the return direction.'
+            )
         else:
             object.__setattr__(self, name, value)
 
 
+class _RoomBag:
+    """A Bag declared on a Room class, copied into each room on first access.
+
+    Rooms that never read the attribute never pay for the copy. Assigning the
+    attribute on a room replaces its copy, as it would for a plain attribute.
+
+    As the copy is made on first access rather than when the room is created,
+    a room sees the class Bag as it is at that time: items added to or
+    removed from the class Bag in the meantime show up in rooms that have not
+    read it yet. Set up class Bags before play starts.
+
+    """
+
+    def __init__(self, name, bag):
+        self.name = name
+        self.bag = bag
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self.bag
+        bag = deepcopy(self.bag)
+        object.__setattr__(instance, self.name, bag)
+        return bag
+
+
 Room.add_direction('north', 'south')
 Room.add_direction('east', 'west')
 
 
+#: Incremented whenever any room's exits change, to invalidate graph caches.
+_exits_version = 0
+
+#: The maximum number of rooms whose breadth-first search results are cached
+#: by `_search_from()`. Each result holds an entry for every reachable room.
+GRAPH_CACHE_SIZE = 64
+
+#: Cached results of `_search_from()`, by starting room.
+_search_cache = OrderedDict()
+_search_cache_version = 0
+
+
+def _search_from(start):
+    """Search the rooms reachable from `start` through their exits.
+
+    Return a tuple ``(steps, parents)``. `steps` maps each reachable
+    room to the number of moves needed to get there, and `parents` maps each
+    reachable room other than `start` to ``(room, direction)``, the previous
+    step on a shortest path to it.
+
+    Results are cached until any room's exits change.
+
+    """
+    global _search_cache_version
+    if _search_cache_version != _exits_version:
+        _search_cache.clear()
+        _search_cache_version = _exits_version
+    try:
+        result = _search_cache[start]
+    except KeyError:
+        pass
+    else:
+        _search_cache.move_to_end(start)
+        return result
+
+    steps = {start: 0}
+    parents = {}
+    queue = deque([start])
+    while queue:
+        room = queue.popleft()
+        distance = steps[room] + 1
+        for direction, dest in room._exit_map().items():
+            if dest not in steps and isinstance(dest, Room):
+                steps[dest] = distance
+                parents[dest] = (room, direction)
+                queue.append(dest)
+
+    result = _search_cache[start] = (steps, parents)
+    if len(_search_cache) > GRAPH_CACHE_SIZE:
+        _search_cache.popitem(last=False)
+    return result
+
+
+def distances(start):
+    """Get the number of moves needed to reach each room from `start`.
+
+    Return a read-only mapping from each reachable room to its distance.
+
+    """
+    return MappingProxyType(_search_from(start)[0])
+
+
+def reachable(start):
+    """Get the set of rooms reachable from `start`, including itself."""
+    return distances(start).keys()
+
+
+def shortest_path(start, goal):
+    """Find a shortest route from the room `start` to the room `goal`.
+
+    Return the list of directions to take, which is empty if `start` is
+    `goal`, or None if `goal` cannot be reached.
+
+    """
+    steps, parents = _search_from(start)
+    if goal not in steps:
+        return None
+    path = []
+    room = goal
+    while room is not start:
+        room, direction = parents[room]
+        path.append(direction)
+    path.reverse()
+    return path
+
+
+def connected_components(rooms):
+    """Group rooms into sets that are connected to each other by exits.
+
+    Exits are followed in both directions, so rooms are in the same set if a
+    player could get from one to the other ignoring one-way exits. Every room
+    reachable through exits from `rooms` is included even if it is not in
+    `rooms`; a room that only has exits leading into them is found only if it
+    is in `rooms`, so pass all the rooms of the map to group the whole map.
+
+    Return a list of sets of rooms.
+
+    """
+    # Union-find over the rooms, with path halving
+    parent = {}
+
+    def find(room):
+        parent.setdefault(room, room)
+        while parent[room] is not room:
+            parent[room] = parent[parent[room]]
+            room = parent[room]
+        return room
+
+    pending = list(rooms)
+    seen = set()
+    while pending:
+        room = pending.pop()
+        if room in seen:
+            continue
+        seen.add(room)
+        root = find(room)
+        for dest in room._exit_map().values():
+            if isinstance(dest, Room):
+                if dest not in seen:
+                    pending.append(dest)
+                other = find(dest)
+                if other is not root:
+                    parent[other] = root
+
+    components = {}
+    for room in parent:
+        components.setdefault(find(room), set()).add(room)
+    return list(components.values())
+
+
 class Item:
-    """A generic item object that can be referred to by a number of names."""
+    """A generic item object that can be referred to by a number of names.
+
+    Items define ``__slots__`` to keep them small, and alias strings are
+    interned so that items with the same names share them. Subclasses that do
+    not define ``__slots__`` themselves, such as NPCs that carry extra
+    attributes, get an instance ``__dict__`` as usual.
+
+    """
+    __slots__ = ('name', 'aliases', '__weakref__')
 
     def __init__(self, name, *aliases):
         self.name = name
         self.aliases = tuple(
-            label.lower()
+            sys.intern(label.lower())
             for label in (name,) + aliases
         )
 
@@ -233,8 +520,16 @@ class Bag(set):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._alias_dict = {}
-        for item in self:
-            self._add_aliases(item)
+
+        # The items in arbitrary order, and the position of each item in that
+        # list, so that a random item can be chosen or removed in O(1).
+        self._items = []
+        self._positions = {}
+
+        # Index of the words in item aliases, built on first use by search().
+        self._word_index = None
+        self._words = None
+        self._track_all(self)
 
     #######
     # Convenience functions to update internal alias dict.
@@ -253,67 +548,230 @@ class Bag(set):
             if not item_set and alias in self._alias_dict:
                 del self._alias_dict[alias]
 
+    #######
+    # Convenience functions to keep the internal indexes in step with the set.
+    #######
+    def _add_words(self, item):
+        for word in set(' '.join(item.aliases).split()):
+            item_set = self._word_index.get(word)
+            if item_set is None:
+                self._word_index[word] = {item}
+                bisect.insort(self._words, word)
+            else:
+                item_set.add(item)
+
+    def _discard_words(self, item):
+        for word in set(' '.join(item.aliases).split()):
+            item_set = self._word_index.get(word)
+            if item_set is None:
+                continue
+            item_set.discard(item)
+            if not item_set:
+                del self._word_index[word]
+                del self._words[bisect.bisect_left(self._words, word)]
+
+    def _track(self, item):
+        """Index an item that has just been added to the set."""
+        self._add_aliases(item)
+        if self._word_index is not None:
+            self._add_words(item)
+        self._positions[item] = len(self._items)
+        self._items.append(item)
+
+    def _untrack(self, item):
+        """Remove an item that has just been removed from the set from indexes."""
+        self._discard_aliases(item)
+        if self._word_index is not None:
+            self._discard_words(item)
+        self._untrack_position(item)
+
+    def _untrack_position(self, item):
+        pos = self._positions.pop(item)
+        last = self._items.pop()
+        if last is not item:
+            # Move the last item into the hole left by the removed one
+            self._items[pos] = last
+            self._positions[last] = pos
+
+    def _track_all(self, items):
+        """Index a collection of items that have just been added to the set."""
+        alias_dict = self._alias_dict
+        for item in items:
+            for alias in item.aliases:
+                item_set = alias_dict.get(alias)
+                if item_set is None:
+                    alias_dict[alias] = {item}
+                else:
+                    item_set.add(item)
+        if self._word_index is not None:
+            for item in items:
+                self._add_words(item)
+        start = len(self._items)
+        self._items.extend(items)
+        self._positions.update(zip(self._items[start:], range(start, len(self._items))))
+
+    def _untrack_all(self, items):
+        """Remove a collection of items just removed from the set from indexes."""
+        alias_dict = self._alias_dict
+        for item in items:
+            for alias in item.aliases:
+                item_set = alias_dict.get(alias)
+                if item_set is not None:
+                    item_set.discard(item)
+                    if not item_set:
+                        del alias_dict[alias]
+        if self._word_index is not None:
+            for item in items:
+                self._discard_words(item)
+        if len(items) * 4 < len(self._items):
+            for item in items:
+                self._untrack_position(item)
+        else:
+            # Cheaper to rebuild the random-access index from the set
+            self._items = list(self)
+            self._positions = dict(zip(self._items, range(len(self._items))))
+
     ####### 
     # Implementations of base set interface.
     ####### 
     def add(self, item):
-        super().add(item)
-        self._add_aliases(item)
+        if not super().__contains__(item):
+            super().add(item)
+            self._track(item)
 
     def clear(self):
         super().clear()
         self._alias_dict.clear()
+        self._items.clear()
+        self._positions.clear()
+        self._word_index = self._words = None
+
+    def __deepcopy__(self, memo):
+        # Rebuild the alias dict from the copied items rather than copying it
+        result = type(self)(deepcopy(item, memo) for item in self)
+        memo[id(self)] = result
+        return result
 
     def copy(self):
-        result = super().copy()
-        result._alias_dict = self._alias_dict.copy()
+        return type(self)(self)
+
+    # copy.copy() would otherwise share the indexes in __dict__
+    __copy__ = copy
+
+    def _copy(self):
+        """Return a copy as a plain Bag, copying the indexes instead of rebuilding them."""
+        result = Bag()
+        set.update(result, self)
+        result._alias_dict = {
+            alias: items.copy() for alias, items in self._alias_dict.items()
+        }
+        result._items = self._items.copy()
+        result._positions = self._positions.copy()
         return result
 
-    def difference(self, other_bag):
-        return Bag(super().difference(other_bag))
+    def difference(self, *others):
+        return Bag(super().difference(*others))
 
-    def difference_update(self, other_bag):
-        for element in other_bag:
-            self.discard(element)
+    def difference_update(self, *others):
+        if len(others) == 1:
+            removed = super().intersection(others[0])
+        else:
+            removed = super().intersection(set().union(*others))
+        super().difference_update(removed)
+        self._untrack_all(removed)
 
     def discard(self, item):
-        super().discard(item)
-        self._discard_aliases(item)
+        if super().__contains__(item):
+            super().discard(item)
+            self._untrack(item)
 
-    def intersection(self, other_bag):
-        return Bag(super().intersection(other_bag))
+    def intersection(self, *others):
+        return Bag(super().intersection(*others))
 
-    def intersection_update(self, other_bag):
-        for element in other_bag:
-            self.add(element)
+    def intersection_update(self, *others):
+        removed = super().difference(super().intersection(*others))
+        super().difference_update(removed)
+        self._untrack_all(removed)
 
     def pop(self):
         result = super().pop()
-        self._discard_aliases(result)
+        self._untrack(result)
         return result
 
     def remove(self, item):
         super().remove(item)
-        self._discard_aliases(item)
+        self._untrack(item)
 
     def symmetric_difference(self, other_bag):
         return Bag(super().symmetric_difference(other_bag))
 
     def symmetric_difference_update(self, other_bag):
-        diff = super().symmetric_difference(other_bag)
-        for element in self:
-            if element not in diff:
-                self.remove(element)
-        for element in diff:
-            if element not in self:
-                self.add(element)
-
-    def union(self, other_bag):
-        return Bag(super().union(other_bag))
+        other = set(other_bag)
+        removed = super().intersection(other)
+        added = other.difference(self)
+        super().difference_update(removed)
+        self._untrack_all(removed)
+        super().update(added)
+        self._track_all(added)
+
+    def union(self, *others):
+        result = self._copy()
+        result.update(*others)
+        return result
 
-    def update(self, elements):
-        for element in elements:
-            self.add(element)
+    def update(self, *others):
+        if len(others) == 1:
+            added = set(others[0])
+        else:
+            added = set().union(*others)
+        added.difference_update(self)
+        super().update(added)
+        self._track_all(added)
+
+    # Set operators require both operands to be sets, as they do for set.
+    def __or__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return self.union(other)
+
+    def __and__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return self.difference(other)
+
+    def __xor__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        return self.symmetric_difference(other)
+
+    def __ior__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        if not isinstance(other, (set, frozenset)):
+            return NotImplemented
+        self.symmetric_difference_update(other)
+        return self
 
     ####### 
     # Bag interface.
@@ -330,6 +788,56 @@ class Bag(set):
         for element in self._alias_dict.get(name, []):
             return element
 
+    def search(self, name):
+        """Find the objects in the bag that best match a name.
+
+        An object whose name or alias is exactly `name` is the best match, as
+        for ``find()``. Failing that, objects match if each word of `name` is a
+        word of their aliases; failing that, if each word of `name` starts a
+        word of their aliases. So "lantern" and "brass lan" both find an item
+        named "brass lantern".
+
+        Return a set of the matching objects, which is empty if none match.
+
+        The first search builds an index of the words in aliases, which is then
+        kept up to date as the bag changes.
+
+        """
+        name = name.lower()
+        exact = self._alias_dict.get(name)
+        if exact:
+            return set(exact)
+        words = name.split()
+        if not words:
+            return set()
+
+        if self._word_index is None:
+            self._word_index = {}
+            self._words = []
+            for item in self._items:
+                self._add_words(item)
+
+        found = None
+        for word in words:
+            matches = self._word_index.get(word, set())
+            found = set(matches) if found is None else found & matches
+            if not found:
+                break
+        if found:
+            return found
+
+        found = None
+        for word in words:
+            matches = set()
+            i = bisect.bisect_left(self._words, word)
+            while i < len(self._words) and self._words[i].startswith(word):
+                matches |= self._word_index[self._words[i]]
+                i += 1
+            found = matches if found is None else found & matches
+            if not found:
+                break
+        return found
+
     def __contains__(self, v):
         """Return True if an Item is present in the bag.
 
@@ -361,12 +869,9 @@ class Bag(set):
         Return None if the bag is empty.
 
         """
-        if not self:
+        if not self._items:
             return None
-        which = random.randrange(len(self))
-        for index, obj in enumerate(self):
-            if index == which:
-                return obj
+        return random.choice(self._items)
 
     def take_random(self):
         """Remove an Item from the bag at random, and return it.
@@ -380,24 +885,119 @@ class Bag(set):
         return obj
 
 
-def _register(command, func, context=None, kwargs=None):
-    """Register func as a handler for the given command."""
+#: Commands that have been registered but whose handlers have not yet been
+#: checked by `_validate_commands()`, as ``(registry, command, entry)``.
+_unvalidated = []
+
+
+def _register(command, func, context=None, kwargs=None, registry=None):
+    """Register func as a handler for the given command.
+
+    The handler is added to `registry`, or to the active session's commands
+    if that is None.
+
+    Checking that the handler's arguments fit the command is deferred until
+    `_validate_commands()` is called, which happens before the first command
+    is handled.
+
+    """
     if kwargs is None:
         kwargs = {}
-    pattern = Pattern(command, context)
-    sig = inspect.signature(func)
-    func_argnames = set(sig.parameters)
-    when_argnames = set(pattern.argnames) | set(kwargs.keys())
-    if func_argnames != when_argnames:
-        raise InvalidCommand(
-            'The function %s%s has the wrong signature for @when(%r)' % (
-                func.__name__, sig, command
-            ) + '\n\nThe function arguments should be (%s)' % (
-                ', '.join(pattern.argnames + list(kwargs.keys()))
+    if registry is None:
+        registry = _session.commands
+    pattern = _pattern_table.get((command, context))
+    if pattern is None:
+        pattern = Pattern(command, context)
+        pattern.compile()
+    entry = (pattern, func, kwargs)
+    registry.append(entry)
+    _unvalidated.append((registry, command, entry))
+    _invalidate_commands()
+
+
+def _handler_argnames(func):
+    """Return the set of argument names that a command handler takes."""
+    if (inspect.isfunction(func) and
+            not func.__code__.co_flags & (inspect.CO_VARARGS |
+                                          inspect.CO_VARKEYWORDS) and
+            not hasattr(func, '__wrapped__') and
+            not hasattr(func, '__signature__')):
+        # Plain functions can be checked without building a signature
+        code = func.__code__
+        return set(code.co_varnames[:code.co_argcount + code.co_kwonlyargcount])
+    return set(inspect.signature(func).parameters)
+
+
+def _validate_commands():
+    """Check the handlers of all newly registered commands in one pass.
+
+    If a handler's arguments do not match its command, the command is removed
+    again and InvalidCommand is raised.
+
+    """
+    for i, (registry, command, entry) in enumerate(_unvalidated):
+        pattern, func, kwargs = entry
+        when_argnames = set(pattern.argnames)
+        when_argnames.update(kwargs)
+        if _handler_argnames(func) != when_argnames:
+            del _unvalidated[:i + 1]
+            registry.remove(entry)
+            _invalidate_commands()
+            raise InvalidCommand(
+                'The function %s%s has the wrong signature for @when(%r)' % (
+                    func.__name__, inspect.signature(func), command
+                ) + '\n\nThe function arguments should be (%s)' % (
+                    ', '.join(pattern.argnames + list(kwargs.keys()))
+                )
             )
-        )
+    _unvalidated.clear()
+
+
+#: Precompiled patterns loaded by `load_command_table()`, keyed by
+#: ``(command, context)``.
+_pattern_table = {}
+
+#: The version of the file format written by `save_command_table()`.
+COMMAND_TABLE_VERSION = 1
+
+
+def save_command_table(path):
+    """Save the compiled patterns of all registered commands to a file.
+
+    Loading the file with `load_command_table()` before the commands are
+    registered lets a large game skip parsing its patterns at startup.
+
+    """
+    patterns = []
+    seen = set()
+    for pattern, _, _ in commands:
+        key = (pattern.orig_pattern, pattern.pattern_context)
+        if key not in seen:
+            seen.add(key)
+            patterns.append(pattern.to_table())
+    with open(path, 'w') as f:
+        json.dump({'version': COMMAND_TABLE_VERSION, 'patterns': patterns}, f)
+
 
-    commands.append((pattern, func, kwargs))
+def load_command_table(path):
+    """Load patterns saved by `save_command_table()`.
+
+    Commands registered afterwards whose pattern and context appear in the
+    table use the saved form instead of being parsed again. Return False,
+    loading nothing, if the file is missing or from a different version.
+
+    """
+    try:
+        with open(path) as f:
+            table = json.load(f)
+    except FileNotFoundError:
+        return False
+    if table.get('version') != COMMAND_TABLE_VERSION:
+        return False
+    for row in table['patterns']:
+        pattern = Pattern.from_table(row)
+        _pattern_table[pattern.orig_pattern, pattern.pattern_context] = pattern
+    return True
 
 
 class Pattern:
@@ -410,7 +1010,7 @@ class Pattern:
 
     def __init__(self, pattern, context=None):
         self.orig_pattern = pattern
-        _validate_context(context)
+        self.context_node = _context_node(context)
         self.pattern_context = context
         words = pattern.split()
         match = []
@@ -448,6 +1048,87 @@ class Pattern:
             self.prefix.append(w)
         self.pattern = match[len(self.prefix):]
         self.fixed = len(self.pattern) - self.placeholders
+        self.segments = None
+        self.compiled = None
+
+    def to_table(self):
+        """Return this pattern as a list that can be stored as JSON.
+
+        Placeholders are written as one-element lists holding their name.
+
+        """
+        return [
+            self.orig_pattern,
+            self.pattern_context,
+            self.argnames,
+            self.prefix,
+            [[w.name] if isinstance(w, Placeholder) else w
+             for w in self.pattern],
+        ]
+
+    @classmethod
+    def from_table(cls, row):
+        """Construct a compiled pattern from a list made by `to_table()`."""
+        orig_pattern, context, argnames, prefix, pattern = row
+        self = cls.__new__(cls)
+        self.orig_pattern = orig_pattern
+        self.context_node = _context_node(context)
+        self.pattern_context = context
+        self.argnames = list(argnames)
+        self.prefix = list(prefix)
+        self.pattern = [
+            Placeholder(w[0]) if isinstance(w, list) else w
+            for w in pattern
+        ]
+        self.placeholders = len(self.argnames)
+        self.fixed = len(self.pattern) - self.placeholders
+        self.compile()
+        return self
+
+    def compile(self):
+        """Precompute the form of this pattern that is used for matching.
+
+        This is done when a command is registered, or else on the first match.
+        Call it again after changing `prefix` or `pattern`.
+
+        Return a tuple ``(prefix, min_words, has_pattern)``.
+
+        """
+        self.segments = self._compile_segments(self.pattern)
+        self.compiled = (
+            tuple(self.prefix),
+            len(self.argnames),
+            bool(self.pattern),
+        )
+        return self.compiled
+
+    @staticmethod
+    def _compile_segments(pattern):
+        """Split the part of a pattern after the prefix into segments.
+
+        Return a list of ``(names, literals, minimum)`` tuples: a run of
+        consecutive placeholder names, the run of literal words that follows
+        it (which is empty only for the last segment), and the minimum number
+        of input words that must come before the segment.
+
+        """
+        segments = []
+        names = []
+        literals = []
+        minimum = 0
+        for w in pattern:
+            if isinstance(w, Placeholder):
+                if literals:
+                    segments.append((tuple(names), tuple(literals), minimum))
+                    minimum += len(names) + len(literals)
+                    names = []
+                    literals = []
+                names.append(w.name)
+            else:
+                literals.append(w)
+        if names:
+            segments.append((tuple(names), tuple(literals), minimum))
+        return segments
 
     def __repr__(self):
         ctx = ''
@@ -492,13 +1173,14 @@ class Pattern:
 
     def is_active(self):
         """Return True if a command is active in the current context."""
-        return _match_context(self.pattern_context, current_context)
+        node = self.context_node
+        return node is None or node.within(_current_node)
 
     def ctx_order(self):
         """Return an integer indicating how nested the context is."""
-        if not self.pattern_context:
+        if self.context_node is None:
             return 0
-        return self.pattern_context.count(CONTEXT_SEP) + 1
+        return self.context_node.depth
 
     def match(self, input_words):
         """Match a given list of input words against this pattern.
@@ -507,44 +1189,67 @@ class Pattern:
         the pattern does not match.
 
         """
-        global current_context
-
-        if len(input_words) < len(self.argnames):
+        prefix, min_words, has_pattern = self.compiled or self.compile()
+        if len(input_words) < min_words:
             return None
 
-        if input_words[:len(self.prefix)] != self.prefix:
+        if tuple(input_words[:len(prefix)]) != prefix:
             return None
 
-        input_words = input_words[len(self.prefix):]
+        input_words = input_words[len(prefix):]
 
-        if not input_words and not self.pattern:
+        if not input_words and not has_pattern:
             return {}
-        if bool(input_words) != bool(self.pattern):
+        if bool(input_words) != has_pattern:
             return None
 
-        have = len(input_words) - self.fixed
+        return self._match_segments(input_words)
 
-        for combo in self.word_combinations(have, self.placeholders):
-            matches = {}
-            take = iter(combo)
-            inp = iter(input_words)
-            try:
-                for cword in self.pattern:
-                    if isinstance(cword, Placeholder):
-                        count = next(take)
-                        ws = []
-                        for _ in range(count):
-                            ws.append(next(inp))
-                        matches[cword.name] = ws
-                    else:
-                        word = next(inp)
-                        if cword != word:
-                            break
+    def _match_segments(self, input_words):
+        """Assign input words to the placeholders of this pattern.
+
+        Each run of literal words is anchored at the rightmost position where
+        it can occur, working backwards from the end of the input, which
+        gives earlier placeholders as many words as possible. This is the
+        same assignment as trying each of `word_combinations()` in turn, but
+        takes time linear in the length of the input.
+
+        """
+        segments = self.segments
+        last = len(segments) - 1
+        stops = [0] * len(segments)
+        end = len(input_words)
+        for i in range(last, -1, -1):
+            names, literals, minimum = segments[i]
+            size = len(literals)
+            lowest = minimum + len(names)
+            if i == last:
+                # Trailing literal words must match the end of the input
+                start = end - size
+                if start < lowest or tuple(input_words[start:end]) != literals:
+                    return None
+            else:
+                first = literals[0]
+                for start in range(end - size, lowest - 1, -1):
+                    if (input_words[start] == first and
+                            tuple(input_words[start:start + size]) == literals):
+                        break
                 else:
-                    return {k: ' '.join(v) for k, v in matches.items()}
-            except StopIteration:
-                continue
-        return None
+                    return None
+            stops[i] = start
+            end = start - len(names)
+
+        matches = {}
+        pos = 0
+        for (names, literals, _), stop in zip(segments, stops):
+            # The first placeholder in a run is greedy, the rest take one word
+            take = stop - pos - len(names) + 1
+            for name in names:
+                matches[name] = ' '.join(input_words[pos:pos + take])
+                pos += take
+                take = 1
+            pos += len(literals)
+        return matches
 
 
 def prompt():
@@ -568,57 +1273,297 @@ def when(command, context=None, **kwargs):
 def help():
     """Print a list of the commands you can give."""
     print('Here is a list of the commands you can give:')
-    cmds = sorted(c.orig_pattern for c, _, _ in commands if c.is_active())
+    cmds = sorted(c.orig_pattern for c, _, _ in _available_commands())
     for c in cmds:
         print(c)
 
 
+#: The number of distinct inputs whose resolved command is remembered in each
+#: context. Set to 0 to disable the cache.
+MATCH_CACHE_SIZE = 256
+
+
+class _CommandTable:
+    """The commands from a registry that are available in one context.
+
+    `available` lists the active commands in the order they should be tried.
+    `index` and `fallback` are as returned by `_build_command_index()`, and
+    `matches` is an LRU cache mapping tuples of input words to the resolved
+    ``(func, args)``, or None if nothing matched.
+
+    """
+    __slots__ = ('registry', 'available', 'index', 'fallback', 'matches')
+
+    def __init__(self, registry):
+        self.registry = registry
+        available = []
+        for c in registry:
+            pattern = c[0]
+            if pattern.is_active():
+                available.append(c)
+        available.sort(
+            key=lambda c: c[0].ctx_order(),
+            reverse=True,
+        )
+        self.available = available
+        self.index, self.fallback = _build_command_index(available)
+        self.matches = OrderedDict()
+
+    def candidates(self, words):
+        """Return the commands that could match the given input words."""
+        if not words:
+            return self.fallback
+        return self.index.get(words[0], self.fallback)
+
+    def resolve(self, words):
+        """Find the command matching a tuple of input words.
+
+        Return a tuple ``(func, args)``, or None if no command matches.
+
+        """
+        matches = self.matches
+        try:
+            resolved = matches[words]
+        except KeyError:
+            pass
+        else:
+            matches.move_to_end(words)
+            return resolved
+
+        resolved = None
+        for pattern, func, kwargs in self.candidates(words):
+            match = pattern.match(words)
+            if match is not None:
+                args = kwargs.copy()
+                args.update(match)
+                resolved = func, args
+                break
+
+        if MATCH_CACHE_SIZE > 0:
+            matches[words] = resolved
+            if len(matches) > MATCH_CACHE_SIZE:
+                matches.popitem(last=False)
+        return resolved
+
+
+#: Cache of the commands available in each context.
+#:
+#: Maps ``(id(registry), context)`` to a `_CommandTable` built from that list
+#: of commands. Entries are built on demand and the whole cache is discarded
+#: whenever a command is registered.
+_command_cache = {}
+
+
+def _invalidate_commands():
+    """Discard all cached command lists, so that they are rebuilt on use."""
+    _command_cache.clear()
+
+
+def _context_commands():
+    """Return the command table for the active session, building it if needed."""
+    global _current_node
+    node = _context_node(current_context)
+    if node is not _current_node:
+        # current_context was assigned directly rather than with set_context()
+        _session.context_node = _current_node = node
+    registry = _session.commands
+    key = (id(registry), node)
+    table = _command_cache.get(key)
+    if table is None or table.registry is not registry:
+        if _unvalidated:
+            _validate_commands()
+        table = _command_cache[key] = _CommandTable(registry)
+    return table
+
+
 def _available_commands():
     """Return the list of available commands in the current context.
 
     The order will be the order in which they should be considered, which
     corresponds to how deeply nested the context is.
 
+    The list is cached and shared, and must not be modified.
+
     """
-    available_commands = []
-    for c in commands:
-        pattern = c[0]
-        if pattern.is_active():
-            available_commands.append(c)
-    available_commands.sort(
-        key=lambda c: c[0].ctx_order(),
-        reverse=True,
-    )
-    return available_commands
+    return _context_commands().available
+
+
+def _build_command_index(available):
+    """Index a list of available commands by the first word they match.
+
+    Return a tuple ``(index, fallback)``. `index` maps each first literal word
+    to the commands that could match input starting with that word, and
+    `fallback` lists the commands that begin with a placeholder and so could
+    match any input. Both preserve the order of `available`.
+
+    """
+    index = {}
+    for c in available:
+        prefix = c[0].prefix
+        if prefix:
+            index.setdefault(prefix[0], [])
+
+    fallback = []
+    for c in available:
+        prefix = c[0].prefix
+        if prefix:
+            index[prefix[0]].append(c)
+        else:
+            fallback.append(c)
+            for bucket in index.values():
+                bucket.append(c)
+    return index, fallback
 
 
 def _handle_command(cmd):
     """Handle a command typed by the user."""
-    ws = cmd.lower().split()
+    ws = tuple(cmd.lower().split())
 
-    for pattern, func, kwargs in _available_commands():
-        args = kwargs.copy()
-        matches = pattern.match(ws)
-        if matches is not None:
-            args.update(matches)
+    with _buffered_output():
+        resolved = _context_commands().resolve(ws)
+        if resolved is None:
+            no_command_matches(cmd)
+        else:
+            func, args = resolved
             func(**args)
-            break
-    else:
-        no_command_matches(cmd)
-    print()
+            _compact_journals()
+        print()
+
+
+class Session:
+    """The state of one player's game.
+
+    A session holds the current command context, the list of commands that
+    the player can give, and any other per-player state the game needs, such
+    as the current room or the inventory. Keyword arguments are set as
+    attributes::
+
+        session = Session(current_room=hall, inventory=Bag())
+
+    By default all sessions share the module's `commands` list, where
+    ``@when`` registers commands while such a session is active; pass a list
+    as `commands` to give a session its own. If `output` is given,
+    everything printed while the session is active is written to it. The
+    session starts in `context`, or with no context.
+
+    Exactly one session is active at a time. `set_context()`, `get_context()`
+    and `say()` act on the active session, and command handlers can fetch it
+    with `get_session()`.
+
+    """
+
+    def __init__(self, commands=None, output=None, context=None, **state):
+        self._commands = commands
+        self.context_node = _context_node(context)
+        self.output = output
+        for k, v in state.items():
+            if hasattr(Session, k) or k in ('context_node', '_commands'):
+                raise TypeError(
+                    '%r is used by Session and cannot be given as state' % k
+                )
+            setattr(self, k, v)
+
+    @contextmanager
+    def activated(self):
+        """Make this the active session for the duration of a with block."""
+        global _session, current_context, _current_node
+        if _session is self:
+            yield self
+            return
+        previous = _session
+        _session = self
+        current_context = self.context
+        _current_node = self.context_node
+        try:
+            if self.output is None:
+                yield self
+            else:
+                with redirect_stdout(self.output):
+                    yield self
+        finally:
+            _session = previous
+            current_context = previous.context
+            _current_node = previous.context_node
+
+    @property
+    def commands(self):
+        """The session's list of commands.
+
+        If the session was not given its own, this is the module's `commands`
+        list, looked up each time so that rebinding it takes effect.
+
+        """
+        if self._commands is None:
+            return globals()['commands']
+        return self._commands
+
+    @commands.setter
+    def commands(self, commands):
+        self._commands = commands
+
+    @property
+    def context(self):
+        """The context of this session, as a string or None."""
+        node = self.context_node
+        return None if node is None else node.name
+
+    def when(self, command, context=None, **kwargs):
+        """Decorator for command functions, added to this session's commands."""
+        def dec(func):
+            _register(command, func, context, kwargs, self.commands)
+            return func
+        return dec
+
+    def set_context(self, new_context):
+        """Set the context of this session."""
+        with self.activated():
+            set_context(new_context)
+
+    def get_context(self):
+        """Get the context of this session."""
+        return self.context
+
+    def say(self, msg):
+        """Print a message to this session's player."""
+        with self.activated():
+            say(msg)
+
+    def handle_command(self, cmd):
+        """Handle a command typed by this session's player."""
+        with self.activated():
+            _handle_command(cmd)
+
+
+def get_session():
+    """Get the active session."""
+    return _session
+
+
+def _add_help_commands(registry=None):
+    """Register the built-in 'help' and '?' commands if they are not present."""
+    help = globals()['help']
+    if registry is None:
+        registry = _session.commands
+    if any(func is help for _, func, _ in registry):
+        return
+    qmark = Pattern('help')
+    qmark.prefix = ['?']
+    qmark.orig_pattern = '?'
+    qmark.compile()
+    registry.insert(0, (Pattern('help'), help, {}))
+    registry.insert(0, (qmark, help, {}))
+    _invalidate_commands()
 
 
 def start(help=True):
     """Run the game."""
     if help:
-        # Ugly, but we want to keep the arguments consistent
-        help = globals()['help']
-        qmark = Pattern('help')
-        qmark.prefix = ['?']
-        qmark.orig_pattern = '?'
-        commands.insert(0, (Pattern('help'), help, {}))
-        commands.insert(0, (qmark, help, {}))
+        _add_help_commands()
+    _validate_commands()
+    watching = _watch_terminal_size()
     while True:
+        if not watching:
+            _forget_terminal_size()
         try:
             cmd = input(prompt()).strip()
         except EOFError:
@@ -631,6 +1576,188 @@ def start(help=True):
         _handle_command(cmd)
 
 
+def _capture_command(session, cmd):
+    """Handle a command in the given session, capturing what it prints.
+
+    Return a tuple ``(output, exited)``, where `exited` is True if the command
+    tried to exit the game.
+
+    """
+    output = io.StringIO()
+    try:
+        with session.activated(), redirect_stdout(output):
+            _handle_command(cmd)
+    except SystemExit:
+        return output.getvalue(), True
+    return output.getvalue(), False
+
+
+def run_commands(cmds, help=True, session=None):
+    """Run a sequence of commands without reading them from the terminal.
+
+    `cmds` may be any iterable of command strings, such as a list or an open
+    file. Blank lines are skipped, as they are by `start()`. The commands are
+    run in `session`, or in the active session if that is None.
+
+    This is a generator: for each command it yields a tuple ``(cmd, output)``
+    where `output` is the text printed while handling the command. It stops
+    after any command that exits the game, such as 'quit'.
+
+    """
+    if session is None:
+        session = _session
+    if help:
+        _add_help_commands(session.commands)
+    _validate_commands()
+    for cmd in cmds:
+        cmd = cmd.strip()
+        if not cmd:
+            continue
+
+        output, exited = _capture_command(session, cmd)
+        yield cmd, output
+        if exited:
+            return
+
+
+async def start_async(reader, writer, session=None, help=True):
+    """Run the game over a pair of asyncio streams, such as a TCP connection.
+
+    Commands are read a line at a time from `reader` and handled in `session`
+    (a new `Session` if None), and what they print is written to `writer`.
+    This returns at the end of the input, or after any command that exits the
+    game, such as 'quit'. It does not close `writer`.
+
+    Command handlers are still called synchronously, so any number of idle
+    connections can share one event loop as long as handlers do not block.
+
+    """
+    if session is None:
+        session = Session()
+    if help:
+        _add_help_commands(session.commands)
+    _validate_commands()
+    while True:
+        writer.write(prompt().encode('utf8'))
+        await writer.drain()
+        line = await reader.readline()
+        if not line:
+            break
+
+        cmd = line.decode('utf8', 'replace').strip()
+        if not cmd:
+            continue
+
+        output, exited = _capture_command(session, cmd)
+        writer.write(output.encode('utf8'))
+        await writer.drain()
+        if exited:
+            break
+
+
+async def start_server(host='127.0.0.1', port=8023, session_factory=Session,
+                       help=True):
+    """Start a TCP server that runs the game for each connection.
+
+    A session is created for each connection by calling `session_factory()`.
+    Return the `asyncio.Server`, which is already accepting connections.
+
+    """
+    async def handle_connection(reader, writer):
+        try:
+            await start_async(reader, writer, session_factory(), help)
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port)
+
+
+class _OutputBuffer:
+    """A text stream that collects writes until it is flushed.
+
+    Anything not defined here, such as ``fileno()``, is delegated to the
+    underlying stream. ``input()`` flushes ``sys.stdout`` before prompting, so
+    handlers that read input still show their output first.
+
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+        return len(text)
+
+    def flush(self):
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts.clear()
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def _buffered_output():
+    """Buffer everything printed during a with block, writing it once at the end."""
+    buf = _OutputBuffer(sys.stdout)
+    try:
+        with redirect_stdout(buf):
+            yield buf
+    finally:
+        buf.flush()
+
+
+#: The cached terminal width used by `say()`, or None to look it up again.
+_terminal_width = None
+
+
+def _get_terminal_width():
+    """Return the width of the terminal, looking it up only when needed."""
+    global _terminal_width
+    if _terminal_width is None:
+        _terminal_width = get_terminal_size()[0]
+    return _terminal_width
+
+
+def _forget_terminal_size(*args):
+    """Discard the cached terminal width; also usable as a signal handler."""
+    global _terminal_width
+    _terminal_width = None
+
+
+def _watch_terminal_size():
+    """Refresh the cached terminal width whenever the terminal is resized.
+
+    Return False if resizes cannot be detected on this platform, in which case
+    the caller should call `_forget_terminal_size()` itself from time to time.
+
+    """
+    if not hasattr(signal, 'SIGWINCH'):
+        return False
+    try:
+        signal.signal(signal.SIGWINCH, _forget_terminal_size)
+    except ValueError:
+        # Signal handlers can only be installed from the main thread
+        return False
+    return True
+
+
+_LINE_STRIP_RE = re.compile(r'^[ \t]*(.*?)[ \t]*$', flags=re.M)
+_PARAGRAPH_RE = re.compile(r'\n(?:[ \t]*\n)')
+
+
+@functools.lru_cache(maxsize=256)
+def _format_message(msg, width):
+    """Dedent and wrap msg to the given width, as `say()` prints it."""
+    msg = _LINE_STRIP_RE.sub(r'\1', msg)
+    paragraphs = _PARAGRAPH_RE.split(msg)
+    formatted = (textwrap.fill(p.strip(), width=width) for p in paragraphs)
+    return '\n\n'.join(formatted)
+
+
 def say(msg):
     """Print a message.
 
@@ -641,14 +1768,458 @@ def say(msg):
     separately.
 
     """
-    msg = str(msg)
-    msg = re.sub(r'^[ \t]*(.*?)[ \t]*$', r'\1', msg, flags=re.M)
-    width = get_terminal_size()[0]
-    paragraphs = re.split(r'\n(?:[ \t]*\n)', msg)
-    formatted = (textwrap.fill(p.strip(), width=width) for p in paragraphs)
-    print('\n\n'.join(formatted))
+    print(_format_message(str(msg), _get_terminal_width()))
+
+
+#: Marks the start of data written by `snapshot()`.
+SNAPSHOT_MAGIC = b'ALSV'
+
+#: The version of the snapshot format, written after `SNAPSHOT_MAGIC`.
+SNAPSHOT_VERSION = 1
+
+
+class _StateWriter:
+    """Encode game state values into the compact binary snapshot format.
+
+    Each value is a one-byte tag followed by its data. Integers and lengths
+    are unsigned LEB128 varints, with signed integers zigzag-encoded. Each
+    distinct string is written once and later referred to by its index.
+    Objects whose id is in the `names` map, such as Rooms and Items, are
+    written as their name rather than their contents.
+
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.strings = {}
+        self.out = bytearray()
+
+    def varint(self, n):
+        out = self.out
+        while n > 0x7f:
+            out.append((n & 0x7f) | 0x80)
+            n >>= 7
+        out.append(n)
+
+    def string(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            self.strings[text] = len(self.strings)
+            data = text.encode('utf8')
+            self.out += b'S'
+            self.varint(len(data))
+            self.out += data
+        else:
+            self.out += b's'
+            self.varint(index)
+
+    def value(self, v):
+        out = self.out
+        if v is None:
+            out += b'N'
+        elif v is True:
+            out += b'T'
+        elif v is False:
+            out += b'F'
+        elif type(v) is str:
+            self.string(v)
+        elif type(v) is int:
+            out += b'I'
+            self.varint(v << 1 if v >= 0 else ((-v) << 1) - 1)
+        elif type(v) is float:
+            out += b'D'
+            out += struct.pack('<d', v)
+        elif id(v) in self.names:
+            out += b'R'
+            self.string(self.names[id(v)])
+        else:
+            if isinstance(v, Bag):
+                tag = b'B'
+            elif isinstance(v, (set, frozenset)):
+                tag = b'E'
+            elif isinstance(v, list):
+                tag = b'L'
+            elif isinstance(v, tuple):
+                tag = b'U'
+            elif isinstance(v, dict):
+                out += b'M'
+                self.varint(len(v))
+                for key, item in v.items():
+                    self.value(key)
+                    self.value(item)
+                return
+            else:
+                raise TypeError(
+                    'Cannot save %r: it is not a basic value and has no name' % (v,)
+                )
+            out += tag
+            self.varint(len(v))
+            for item in v:
+                self.value(item)
+
+
+class _StateReader:
+    """Decode values written by `_StateWriter`."""
+
+    def __init__(self, data, objects, pos=0):
+        self.data = data
+        self.objects = objects
+        self.strings = []
+        self.pos = pos
+
+    def varint(self):
+        data = self.data
+        n = shift = 0
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            n |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def string(self, tag):
+        if tag == b'S':
+            size = self.varint()
+            if self.pos + size > len(self.data):
+                raise ValueError('Corrupt snapshot: data is truncated')
+            text = bytes(self.data[self.pos:self.pos + size]).decode('utf8')
+            self.pos += size
+            self.strings.append(text)
+            return text
+        if tag == b's':
+            return self.strings[self.varint()]
+        raise ValueError('Corrupt snapshot: expected a string')
+
+    def tag(self):
+        tag = self.data[self.pos:self.pos + 1]
+        self.pos += 1
+        return bytes(tag)
+
+    def value(self):
+        tag = self.tag()
+        if tag == b'N':
+            return None
+        if tag == b'T':
+            return True
+        if tag == b'F':
+            return False
+        if tag in (b'S', b's'):
+            return self.string(tag)
+        if tag == b'I':
+            n = self.varint()
+            return n >> 1 if not n & 1 else -((n + 1) >> 1)
+        if tag == b'D':
+            (v,) = struct.unpack_from('<d', self.data, self.pos)
+            self.pos += 8
+            return v
+        if tag == b'R':
+            name = self.string(self.tag())
+            try:
+                return self.objects[name]
+            except KeyError:
+                raise ValueError('Snapshot refers to unknown object %r' % name)
+        if tag == b'M':
+            result = {}
+            for _ in range(self.varint()):
+                key = self.value()
+                result[key] = self.value()
+            return result
+        if tag in (b'L', b'U', b'E', b'B'):
+            items = [self.value() for _ in range(self.varint())]
+            if tag == b'L':
+                return items
+            if tag == b'U':
+                return tuple(items)
+            if tag == b'E':
+                return set(items)
+            return Bag(items)
+        raise ValueError('Corrupt snapshot: unknown tag %r' % tag)
+
+
+def snapshot(state, objects):
+    """Save game state to a compact, versioned binary snapshot.
+
+    `state` is a dict of values to save, such as the current room and the
+    inventory. Values may be None, bools, ints, floats, strings, lists,
+    tuples, sets, Bags and dicts of these, and any of the objects in
+    `objects`, which maps a stable name to each Room, Item or other game
+    object. Objects are saved by name, so the snapshot stays small and can be
+    restored into a freshly started game.
+
+    Return the snapshot as bytes.
+
+    """
+    names = {}
+    for name, obj in objects.items():
+        names[id(obj)] = name
+    writer = _StateWriter(names)
+    writer.out += SNAPSHOT_MAGIC
+    writer.varint(SNAPSHOT_VERSION)
+    writer.value(dict(state))
+    return bytes(writer.out)
+
+
+def restore(data, objects):
+    """Load game state from a snapshot made by `snapshot()`.
+
+    `objects` must map the same names to the objects of the running game.
+    Return the state dict. Raise ValueError if the data is not a snapshot
+    this version can read.
+
+    """
+    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError('Not a saved game')
+    reader = _StateReader(memoryview(data), objects, len(SNAPSHOT_MAGIC))
+    try:
+        version = reader.varint()
+        if version != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported saved game version %d' % version)
+        return reader.value()
+    except (IndexError, struct.error):
+        raise ValueError('Corrupt snapshot: data is truncated')
+
+
+#: Marks the start of a journal file written by `Journal`.
+JOURNAL_MAGIC = b'ALJR'
+
+#: Compact a `Journal` into its snapshot after this many records.
+JOURNAL_COMPACT_EVERY = 1000
+
+
+def _apply_change(state, op, path, value):
+    """Apply one journal record to a state dict."""
+    target = state
+    for key in path[:-1]:
+        target = target[key]
+    key = path[-1]
+    if op == 'set':
+        target[key] = value
+    elif op == 'add':
+        collection = target.setdefault(key, [])
+        if isinstance(collection, list):
+            collection.append(value)
+        else:
+            collection.add(value)
+    elif op == 'remove':
+        collection = target[key]
+        if isinstance(collection, list):
+            if value in collection:
+                collection.remove(value)
+        else:
+            collection.discard(value)
+    else:
+        raise ValueError('Unknown journal operation %r' % op)
+
+
+#: Journals due to be compacted once the current command has finished. A
+#: command may record several changes, and compacting between them would put
+#: half of the command in the snapshot.
+_compact_due = []
+
+
+def _compact_journals():
+    """Compact the journals that have recorded enough changes."""
+    while _compact_due:
+        _compact_due.pop().compact()
+
+
+class Journal:
+    """Save game state incrementally, as a snapshot plus a journal of changes.
+
+    Each state-changing command calls `record()` to append a small record to
+    the journal file at `path + '.journal'`, so the cost of saving does not
+    grow with the size of the game. After the command that makes the
+    `compact_every`-th record, or when `compact()` is called, the current
+    state is written as a snapshot to `path` and the journal is emptied. `load()` restores the snapshot and
+    replays the journal over it.
+
+    `objects` maps stable names to the game's objects, as for `snapshot()`.
+    `state` is a function returning the current state dict; it is needed to
+    compact automatically.
+
+    Call `load()` first to continue a saved game. Otherwise the first
+    record starts a new one, as `start_new()` does.
+
+    A record changes the value at `path`, a tuple of keys into the state
+    dict:
+
+    * `'set'` replaces the value.
+    * `'add'` adds to a set, or appends to a list, creating a list if the
+      key is missing.
+    * `'remove'` removes from a set or list, if present.
+
+    """
+
+    def __init__(self, path, objects, state=None,
+                 compact_every=JOURNAL_COMPACT_EVERY):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.objects = objects
+        self.state = state
+        self.compact_every = compact_every
+        self.generation = 0
+        self.records = 0
+        self._names = None
+        self._file = None
+
+    def _object_names(self):
+        if self._names is None:
+            self._names = {id(obj): name for name, obj in self.objects.items()}
+        return self._names
+
+    def _open(self, mode):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, mode)
+        if mode == 'wb':
+            header = _StateWriter({})
+            header.out += JOURNAL_MAGIC
+            header.varint(SNAPSHOT_VERSION)
+            header.varint(self.generation)
+            self._file.write(header.out)
+            self.records = 0
+
+    def record(self, op, path, value=None):
+        """Append a change to the journal.
+
+        `path` may be a single key or a tuple of keys into the state dict.
+
+        """
+        if not isinstance(path, tuple):
+            path = (path,)
+        if self._file is None:
+            # Not continuing a saved game, so start a new one
+            self.start_new()
+        writer = _StateWriter(self._object_names())
+        writer.value((op, path, value))
+        body = writer.out
+        writer.out = bytearray()
+        writer.varint(len(body))
+        self._file.write(writer.out + body)
+        self._file.flush()
+        self.records += 1
+        if (self.state is not None and self.records >= self.compact_every
+                and self not in _compact_due):
+            _compact_due.append(self)
+
+    def start_new(self):
+        """Start a new saved game.
+
+        The old save, if any, is not deleted but renamed with the suffix
+        `'.bak'`, replacing any earlier backup, so that a save which could not
+        be loaded can still be recovered.
+
+        """
+        if self in _compact_due:
+            _compact_due.remove(self)
+        self.close()
+        for path in (self.path, self.journal_path):
+            if os.path.exists(path):
+                os.replace(path, path + '.bak')
+        self.generation = 0
+        self._open('wb')
+
+    def compact(self, state=None):
+        """Write the whole state as a snapshot and empty the journal."""
+        if state is None:
+            state = self.state()
+        if self in _compact_due:
+            _compact_due.remove(self)
+        self.generation += 1
+        data = snapshot(
+            {'generation': self.generation, 'state': state},
+            self.objects
+        )
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        # A journal left over from a crash at this point has the previous
+        # generation, so load() will know it is already in the snapshot.
+        self._open('wb')
+
+    def load(self, state=None):
+        """Restore the saved state, replaying the journal over the snapshot.
+
+        `state` must be the state of the game before anything was recorded,
+        such as its state at startup, not its current state: with no
+        snapshot yet the whole journal is replayed over it. It is copied, not
+        modified. Return the restored state dict, or None if nothing has been
+        saved. A record cut short by a crash is ignored.
+
+        """
+        state = state or {}
+        found = False
+        try:
+            with open(self.path, 'rb') as f:
+                saved = restore(f.read(), self.objects)
+        except FileNotFoundError:
+            self.generation = 0
+            saved = {'state': {}}
+        else:
+            found = True
+            self.generation = saved['generation']
+        # Copy the keys the snapshot does not replace, as records may change
+        # them in place
+        rest = {k: v for k, v in state.items() if k not in saved['state']}
+        state = restore(snapshot(rest, self.objects), self.objects)
+        state.update(saved['state'])
+
+        try:
+            with open(self.journal_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+            self._open('wb')
+            return state if found else None
+
+        reader = _StateReader(memoryview(data), self.objects, len(JOURNAL_MAGIC))
+        try:
+            current = (reader.varint() == SNAPSHOT_VERSION
+                       and reader.varint() == self.generation)
+        except IndexError:
+            current = False  # header cut short by a crash
+        if not current:
+            # Already folded into the snapshot, or from another version
+            self._open('wb')
+            return state if found else None
+
+        records = 0
+        end = reader.pos
+        while reader.pos < len(data):
+            try:
+                size = reader.varint()
+                if reader.pos + size > len(data):
+                    break
+                reader.strings = []
+                op, path, value = reader.value()
+            except (IndexError, struct.error):
+                break
+            _apply_change(state, op, path, value)
+            records += 1
+            end = reader.pos
+            found = True
+
+        self._open('ab')
+        if end < len(data):
+            self._file.truncate(end)
+        self.records = records
+        return state if found else None
+
+    def close(self):
+        """Close the journal file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
 
 
 commands = [
     (Pattern('quit'), sys.exit, {}),  # quit command is built-in
 ]
+
+
+#: The active session. This is the session used by the module-level functions
+#: such as `set_context()`, and by `start()`.
+_session = Session()
@@ -0,0 +1,63 @@
+"""Time the bulk set operations of Bag on 10k-item bags.
+
+Usage::
+
+    python benchmarks/bag_bulk.py [DIR]
+
+DIR is the directory holding the adventurelib.py to time, by default the
+one this script belongs to; pass an older checkout to compare. Each timing
+is the best of 20 runs, with a new bag built outside the timed part of each
+run.
+
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adventurelib import Bag, Item  # noqa: E402
+
+RUNS = 20
+
+A = [Item('a%d' % i, 'x%d' % i) for i in range(10000)]
+B = [Item('b%d' % i) for i in range(10000)]
+
+
+def best_time(setup, op):
+    """Return the shortest time of `op(bag)` over RUNS fresh bags from `setup`."""
+    best = float('inf')
+    for _ in range(RUNS):
+        bag = setup()
+        start = time.perf_counter()
+        op(bag)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+BENCHMARKS = [
+    ('update with 10k items already present',
+     lambda: Bag(A), lambda bag: bag.update(A)),
+    ('update with 10k new items',
+     lambda: Bag(A), lambda bag: bag.update(B)),
+    ('difference_update removing 10k',
+     lambda: Bag(A + B), lambda bag: bag.difference_update(B)),
+    ('symmetric_difference_update, 5k shared',
+     lambda: Bag(A), lambda bag: bag.symmetric_difference_update(A[:5000] + B)),
+    ('union of 10k + 10k',
+     lambda: Bag(A), lambda bag: bag.union(set(B))),
+    ('difference keeping half of 20k',
+     lambda: Bag(A + B), lambda bag: bag.difference(set(B))),
+    ('intersection keeping half of 20k',
+     lambda: Bag(A + B), lambda bag: bag.intersection(set(B))),
+]
+
+
+if __name__ == '__main__':
+    for name, setup, op in BENCHMARKS:
+        try:
+            result = '%6.1fms' % (best_time(setup, op) * 1000)
+        except Exception as e:  # older versions have bugs in some of these
+            result = 'failed: %r' % e
+        print('%-42s %s' % (name, result))
@@ -0,0 +1,53 @@
+"""Measure the memory taken by many Items with tracemalloc.
+
+Usage::
+
+    python benchmarks/item_memory.py [DIR]
+
+DIR is the directory holding the adventurelib.py to measure, by default the
+one this script belongs to; pass an older checkout to compare. The items
+have three aliases each, drawn from 100 distinct names, as in a large world
+where many items are copies of a few kinds. A subclass without __slots__ is
+measured too, as games like NPC-modual.py define them.
+
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, sys.argv[1] if len(sys.argv) > 1 else
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adventurelib import Item  # noqa: E402
+
+COUNT = 100000
+
+
+class Creature(Item):
+    """An Item subclass with extra attributes and no __slots__."""
+    words = ''
+
+
+def measure(cls, names):
+    """Return the bytes allocated to make an instance of `cls` for each name."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = [cls(*aliases) for aliases in names]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del items
+    return after - before
+
+
+if __name__ == '__main__':
+    names = [
+        ('Brass Lantern %d' % (i % 100), 'Lamp', 'Light')
+        for i in range(COUNT)
+    ]
+    for cls in (Item, Creature):
+        size = measure(cls, names)
+        print('%d %s objects: %.1fMB, %d bytes each' % (
+            COUNT, cls.__name__, size / 1e6, size // COUNT
+        ))
@@ -1,6 +1,218 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import json
+import math
+import os
+from collections import deque
+
+# Project files are JSON Lines: a header line, then one record per line
+PROJECT_FORMAT = "adventurelib-project"
+PROJECT_VERSION = 1
+DIRECTIONS = ('north', 'south', 'east', 'west')
+DIRECTION_OFFSETS = {'north':(0,-1),'south':(0,1),'east':(1,0),'west':(-1,0)}
+CELL_SIZE = 140  # map grid spacing in pixels at zoom 1.0
+DETAIL_ZOOM = 0.6  # below this zoom room labels and arrowheads are not drawn
+
+
+class GraphLayout:
+    # Grid positions of the rooms for the map, kept up to date as rooms and
+    # exits are edited rather than recomputed for every redraw.
+    #
+    # Rooms are placed breadth-first from the root ('start' or the first
+    # room): each room sits one cell from the room whose exit first reached
+    # it, its layout parent. Rooms that cannot be reached from the root are
+    # put on the nearest free cell and their own exits laid out from there.
+    # Edits only move the rooms they affect, so the map stays stable.
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.root = None
+        self.positions = {}  # room_name -> (gx, gy)
+        self.cells = {}  # (gx, gy) -> list of room names in that cell
+        self.parent = {}  # room_name -> (parent_room, direction) it was placed from
+        self.children = {}  # room_name -> set of rooms placed from it
+        self.incoming = {}  # room_name -> set of (room, direction) exits leading to it
+        self.free_ring = 0  # no free cells inside this ring around (0, 0)
+
+    def rebuild(self, rooms, room_exits):
+        self.clear()
+        for r, exits in room_exits.items():
+            for d, tgt in exits.items():
+                self.incoming.setdefault(tgt, set()).add((r, d))
+        if not rooms:
+            return
+        self.root = 'start' if 'start' in rooms else next(iter(rooms))
+        self._place(self.root, (0,0))
+        self._spread(self.root, room_exits)
+        for r in rooms:
+            if r not in self.positions:
+                self._place(r, self._free_cell())
+                self._spread(r, room_exits)
+
+    def _spread(self, room, room_exits):
+        # breadth-first placement of the unplaced rooms reachable from room
+        q = deque([room])
+        while q:
+            r = q.popleft()
+            x,y = self.positions[r]
+            for d, tgt in room_exits.get(r, {}).items():
+                if tgt not in self.positions:
+                    dx,dy = DIRECTION_OFFSETS.get(d,(0,0))
+                    self._place(tgt, (x+dx, y+dy))
+                    self._link(r, d, tgt)
+                    q.append(tgt)
+
+    def _place(self, room, cell):
+        self.positions[room] = cell
+        self.cells.setdefault(cell, []).append(room)
+
+    def _unplace(self, room):
+        cell = self.positions.pop(room)
+        here = self.cells[cell]
+        here.remove(room)
+        if not here:
+            del self.cells[cell]
+            self.free_ring = min(self.free_ring, max(abs(cell[0]), abs(cell[1])))
+        return cell
+
+    def _link(self, room, direction, target):
+        self.parent[target] = (room, direction)
+        self.children.setdefault(room, set()).add(target)
+
+    def _unlink(self, target):
+        room, _ = self.parent.pop(target)
+        self.children[room].discard(target)
+
+    def _free_cell(self):
+        # search square rings outward from the first one that may have a
+        # free cell; the ring is remembered, so placing many rooms does not
+        # rescan the filled middle of the map each time
+        ring = self.free_ring
+        while True:
+            if ring == 0:
+                candidates = [(0,0)]
+            else:
+                candidates = []
+                for i in range(-ring, ring):
+                    candidates += [(i, -ring), (ring, i), (-i, ring), (-ring, -i)]
+            for cell in candidates:
+                if cell not in self.cells:
+                    self.free_ring = ring
+                    return cell
+            ring += 1
+
+    def rooms_in(self, x0, y0, x1, y1):
+        # rooms in the cells x0..x1, y0..y1, in drawing order
+        rooms = []
+        if (x1 - x0 + 1) * (y1 - y0 + 1) < len(self.cells):
+            for gx in range(x0, x1 + 1):
+                for gy in range(y0, y1 + 1):
+                    rooms.extend(self.cells.get((gx, gy), ()))
+        else:
+            for (gx, gy), here in self.cells.items():
+                if x0 <= gx <= x1 and y0 <= gy <= y1:
+                    rooms.extend(here)
+        return rooms
+
+    def add_room(self, name):
+        if name in self.positions:
+            return
+        if self.root is None:
+            self.root = name
+        self._place(name, self._free_cell())
+
+    def remove_room(self, name, exits):
+        # exits are the room's own exits, which have been removed with it
+        for d, tgt in exits.items():
+            self.incoming.get(tgt, set()).discard((name, d))
+        self.incoming.pop(name, None)
+        if name not in self.positions:
+            return
+        self._unplace(name)
+        if name in self.parent:
+            self._unlink(name)
+        # rooms placed from this one stay where they are
+        for child in self.children.pop(name, ()):
+            del self.parent[child]
+        if name == self.root:
+            self.root = None
+
+    def rename_room(self, old_name, new_name, exits):
+        # exits are the room's own exits, now held under the new name
+        if old_name in self.incoming:
+            self.incoming[new_name] = self.incoming.pop(old_name)
+        for d, tgt in exits.items():
+            sources = self.incoming.setdefault(tgt, set())
+            sources.discard((old_name, d))
+            sources.add((new_name, d))
+        if old_name not in self.positions:
+            return
+        cell = self.positions.pop(old_name)
+        self.positions[new_name] = cell
+        here = self.cells[cell]
+        here[here.index(old_name)] = new_name
+        if old_name in self.parent:
+            room, direction = self.parent.pop(old_name)
+            self.parent[new_name] = (room, direction)
+            self.children[room].discard(old_name)
+            self.children[room].add(new_name)
+        children = self.children.pop(old_name, set())
+        if children:
+            self.children[new_name] = children
+            for child in children:
+                self.parent[child] = (new_name, self.parent[child][1])
+        if self.root == old_name:
+            self.root = new_name
+
+    def add_exit(self, room, direction, target, room_exits):
+        # A room that is not yet placed from any other room is moved next to
+        # the new exit, together with the rooms laid out from it, and rooms
+        # it leads to are pulled in the same way.
+        self.incoming.setdefault(target, set()).add((room, direction))
+        if room not in self.positions or not self._movable(target):
+            return
+        ancestors = {room}
+        r = room
+        while r in self.parent:
+            r = self.parent[r][0]
+            ancestors.add(r)
+        if target in ancestors:
+            return
+        q = deque()
+        self._attach(room, direction, target, q)
+        while q:
+            r = q.popleft()
+            for d, tgt in room_exits.get(r, {}).items():
+                if tgt not in ancestors and self._movable(tgt):
+                    self._attach(r, d, tgt, q)
+
+    def _movable(self, target):
+        return (target in self.positions and target not in self.parent
+                and target != self.root)
+
+    def _attach(self, room, direction, target, q):
+        x,y = self.positions[room]
+        dx,dy = DIRECTION_OFFSETS.get(direction,(0,0))
+        tx,ty = self.positions[target]
+        shift_x, shift_y = x + dx - tx, y + dy - ty
+        self._link(room, direction, target)
+        subtree = deque([target])
+        while subtree:
+            r = subtree.popleft()
+            gx,gy = self._unplace(r)
+            self._place(r, (gx + shift_x, gy + shift_y))
+            subtree.extend(self.children.get(r, ()))
+            q.append(r)
+
+    def remove_exit(self, room, direction, target):
+        # a room placed through this exit keeps its place, but may now be
+        # moved by a later exit
+        self.incoming.get(target, set()).discard((room, direction))
+        if self.parent.get(target) == (room, direction):
+            self._unlink(target)
+
 
 class AdventureLibGUI:
     def __init__(self, root):
@@ -24,6 +236,12 @@ class AdventureLibGUI:
         # NPC system
         self.npcs = {}  # npc_name -> dict of attributes
         self.npc_locations = {}  # npc_name -> room_name
+        # Map layout, kept up to date by the room and exit edits
+        self.layout = GraphLayout()
+        # Pending widget refreshes, run together from one idle callback
+        self.dirty = set()
+        self.refresh_pending = False
+        self.shown_values = {}  # widget path -> values it currently shows
         
         self.setup_ui()
     
@@ -76,17 +294,26 @@ class AdventureLibGUI:
         self.canvas = tk.Canvas(top_sect, height=250, bg="#222222")
         self.canvas.pack(fill=tk.X)
         self.canvas.bind('<Button-1>', self.on_canvas_button_down)
+        self.canvas.bind('<Shift-Button-1>', self.on_select_start)  # drag to select rooms
         self.canvas.bind('<B1-Motion>', self.on_pan_motion)
         self.canvas.bind('<ButtonRelease-1>', self.on_pan_end)
         self.canvas.bind('<MouseWheel>', self.on_canvas_scroll)  # Windows
         self.canvas.bind('<Button-4>', self.on_canvas_scroll)    # Linux scroll up
         self.canvas.bind('<Button-5>', self.on_canvas_scroll)    # Linux scroll down
+        self.canvas.bind('<Configure>', lambda event: self.update_view())
         
         # Canvas pan/zoom state
         self.canvas_offset_x = 0
         self.canvas_offset_y = 0
         self.canvas_zoom = 1.0
         self.pan_start = None
+        self.select_start = None
+        self.room_rows = {}  # room_name -> row in room_listbox
+        # Canvas items drawn for the graph, kept between redraws
+        self.node_items = {}  # room_name -> [rect_id, text_id, grid_pos]
+        self.edge_items = {}  # (room_name, direction) -> [line_id, (src_grid_pos, dst_grid_pos)]
+        self.drawn_view = None  # (center_x, center_y, zoom) the items are drawn at
+        self.drawn_window = None  # grid cells (x0, y0, x1, y1) the items cover
         
         # Buttons (right below canvas)
         btn_frame = ttk.Frame(top_sect)
@@ -117,7 +344,7 @@ class AdventureLibGUI:
         list_frame.pack(fill=tk.BOTH, expand=True)
         list_scrollbar = ttk.Scrollbar(list_frame)
         list_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.room_listbox = tk.Listbox(list_frame, yscrollcommand=list_scrollbar.set, height=6)
+        self.room_listbox = tk.Listbox(list_frame, yscrollcommand=list_scrollbar.set, height=6, selectmode=tk.EXTENDED)
         self.room_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.room_listbox.bind('<<ListboxSelect>>', self.on_room_select)
         list_scrollbar.config(command=self.room_listbox.yview)
@@ -450,6 +677,8 @@ class AdventureLibGUI:
         btn_frame.pack(fill=tk.X, padx=5, pady=5)
         ttk.Button(btn_frame, text="Refresh Preview", command=self.refresh_preview).pack(side=tk.LEFT, padx=2)
         ttk.Button(btn_frame, text="Export to File", command=self.export_to_file).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="Save Project", command=self.save_project).pack(side=tk.LEFT, padx=2)
+        ttk.Button(btn_frame, text="Open Project", command=self.open_project).pack(side=tk.LEFT, padx=2)
     
     def add_room(self):
         name = self.room_name_entry.get()
@@ -460,6 +689,7 @@ class AdventureLibGUI:
         way = self.room_way_entry.get().strip() or "passage"
         self.room_ways[name] = way
         self.room_exits.setdefault(name, {})
+        self.layout.add_room(name)
         # Store locked directions and their keys
         locked = set()
         if self.locked_north.get():
@@ -484,8 +714,7 @@ class AdventureLibGUI:
                 self.room_direction_keys[(name, 'west')] = key
         if locked:
             self.room_locked_directions[name] = locked
-        self.refresh_room_list()
-        self.refresh_exits_list()
+        self.schedule_refresh('rooms', 'exits', 'graph')
         self.room_name_entry.delete(0, tk.END)
         self.room_desc_text.delete("1.0", tk.END)
         self.room_way_entry.delete(0, tk.END)
@@ -497,7 +726,6 @@ class AdventureLibGUI:
         self.locked_south_key_var.set("")
         self.locked_east_key_var.set("")
         self.locked_west_key_var.set("")
-        self.update_room_combo()
     
     def update_room(self):
         selection = self.room_listbox.curselection()
@@ -529,6 +757,7 @@ class AdventureLibGUI:
                 for d, t in list(exits.items()):
                     if t == old_name:
                         exits[d] = new_name
+            self.layout.rename_room(old_name, new_name, self.room_exits[new_name])
         
         self.rooms[new_name] = self.room_desc_text.get("1.0", tk.END).strip()
         way = self.room_way_entry.get().strip() or "passage"
@@ -564,8 +793,7 @@ class AdventureLibGUI:
             self.room_locked_directions[new_name] = locked
         elif new_name in self.room_locked_directions:
             del self.room_locked_directions[new_name]
-        self.refresh_room_list()
-        self.update_room_combo()
+        self.schedule_refresh('rooms', 'graph')
     
     def delete_room(self):
         selection = self.room_listbox.curselection()
@@ -587,16 +815,13 @@ class AdventureLibGUI:
         if name in self.room_first_time_commands:
             del self.room_first_time_commands[name]
         # remove exits for this room and references to it
-        if name in self.room_exits:
-            del self.room_exits[name]
+        old_exits = self.room_exits.pop(name, {})
         for r, exits in list(self.room_exits.items()):
             for d, t in list(exits.items()):
                 if t == name:
                     del exits[d]
-        self.refresh_room_list()
-        self.refresh_entry_list()
-        self.refresh_first_time_list()
-        self.update_room_combo()
+        self.layout.remove_room(name, old_exits)
+        self.schedule_refresh('rooms', 'exits', 'entries', 'first_time', 'graph')
     
     def on_room_select(self, event):
         selection = self.room_listbox.curselection()
@@ -620,39 +845,66 @@ class AdventureLibGUI:
             self.locked_east_key_var.set(self.room_direction_keys.get((name, 'east'), ""))
             self.locked_west_key_var.set(self.room_direction_keys.get((name, 'west'), ""))
             # refresh exits for this room
-            self.refresh_exits_list()
+            self.schedule_refresh('exits')
     
+    # Widget refreshes
+    def schedule_refresh(self, *parts):
+        # Mark parts of the UI as out of date; they are refreshed together
+        # once Tk is idle, however many edits asked for them
+        self.dirty.update(parts)
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.root.after_idle(self.run_refresh)
+
+    def run_refresh(self):
+        self.refresh_pending = False
+        dirty, self.dirty = self.dirty, set()
+        # rooms before exits and graph: they read the room list
+        for part, refresh in (('rooms', self.refresh_room_list),
+                              ('exits', self.refresh_exits_list),
+                              ('graph', self.draw_graph),
+                              ('commands', self.refresh_command_list),
+                              ('entries', self.refresh_entry_list),
+                              ('first_time', self.refresh_first_time_list),
+                              ('items', self.refresh_items_list),
+                              ('keys', self.refresh_key_combos),
+                              ('npcs', self.refresh_npc_list)):
+            if part in dirty:
+                refresh()
+
+    def set_list_values(self, widget, values):
+        # Listboxes and comboboxes are only refilled when what they show
+        # has changed; a listbox is refilled with a single insert
+        values = tuple(values)
+        key = str(widget)
+        if self.shown_values.get(key) == values:
+            return False
+        self.shown_values[key] = values
+        if isinstance(widget, tk.Listbox):
+            widget.delete(0, tk.END)
+            widget.insert(tk.END, *values)
+        else:
+            widget['values'] = values
+        return True
+
     def refresh_room_list(self):
-        self.room_listbox.delete(0, tk.END)
-        for name in self.rooms:
-            self.room_listbox.insert(tk.END, name)
-        self.update_room_combo()
-        self.refresh_exit_targets()
-        self.refresh_key_combos()  # Ensure keys are available for room locks
-        # Update NPC room combo as well
-        try:
-            self.npc_room_combo['values'] = list(self.rooms.keys())
-        except Exception:
-            pass
+        names = tuple(self.rooms)
+        if self.set_list_values(self.room_listbox, names):
+            self.room_rows = {name: row for row, name in enumerate(names)}
+        self.update_room_combo(names)
         # Reset pan/zoom when refreshing
         if not self.rooms:
             self.canvas_offset_x = 0
             self.canvas_offset_y = 0
             self.canvas_zoom = 1.0
-        self.draw_graph()
 
-    def refresh_exit_targets(self):
-        vals = list(self.rooms.keys())
-        self.exit_target_combo['values'] = vals
-        self.entry_room_combo['values'] = vals
-    
     def add_command(self):
         trigger = self.cmd_trigger_entry.get()
         if not trigger:
             messagebox.showwarning("Input Error", "Please enter a trigger")
             return
         self.commands[trigger] = self.cmd_code_text.get("1.0", tk.END).strip()
-        self.refresh_command_list()
+        self.schedule_refresh('commands')
         self.cmd_trigger_entry.delete(0, tk.END)
         self.cmd_code_text.delete("1.0", tk.END)
     
@@ -668,7 +920,7 @@ class AdventureLibGUI:
             self.commands[new_trigger] = self.commands.pop(old_trigger)
         
         self.commands[new_trigger] = self.cmd_code_text.get("1.0", tk.END).strip()
-        self.refresh_command_list()
+        self.schedule_refresh('commands')
     
     def delete_command(self):
         selection = self.cmd_listbox.curselection()
@@ -677,7 +929,7 @@ class AdventureLibGUI:
             return
         trigger = self.cmd_listbox.get(selection[0])
         del self.commands[trigger]
-        self.refresh_command_list()
+        self.schedule_refresh('commands')
     
     def on_command_select(self, event):
         selection = self.cmd_listbox.curselection()
@@ -689,9 +941,7 @@ class AdventureLibGUI:
             self.cmd_code_text.insert("1.0", self.commands[trigger])
     
     def refresh_command_list(self):
-        self.cmd_listbox.delete(0, tk.END)
-        for trigger in self.commands:
-            self.cmd_listbox.insert(tk.END, trigger)
+        self.set_list_values(self.cmd_listbox, self.commands)
 
     
     def add_entry_command(self):
@@ -700,7 +950,7 @@ class AdventureLibGUI:
             messagebox.showwarning("Input Error", "Please select a room")
             return
         self.room_entry_commands[room] = self.entry_code_text.get("1.0", tk.END).strip()
-        self.refresh_entry_list()
+        self.schedule_refresh('entries')
         self.entry_code_text.delete("1.0", tk.END)
     
     def update_entry_command(self):
@@ -715,7 +965,7 @@ class AdventureLibGUI:
             self.room_entry_commands[new_room] = self.room_entry_commands.pop(old_room)
         
         self.room_entry_commands[new_room] = self.entry_code_text.get("1.0", tk.END).strip()
-        self.refresh_entry_list()
+        self.schedule_refresh('entries')
     
     def delete_entry_command(self):
         selection = self.entry_listbox.curselection()
@@ -724,7 +974,7 @@ class AdventureLibGUI:
             return
         room = self.entry_listbox.get(selection[0])
         del self.room_entry_commands[room]
-        self.refresh_entry_list()
+        self.schedule_refresh('entries')
     
     def on_entry_select(self, event):
         selection = self.entry_listbox.curselection()
@@ -735,9 +985,7 @@ class AdventureLibGUI:
             self.entry_code_text.insert("1.0", self.room_entry_commands[room])
     
     def refresh_entry_list(self):
-        self.entry_listbox.delete(0, tk.END)
-        for room in self.room_entry_commands:
-            self.entry_listbox.insert(tk.END, room)
+        self.set_list_values(self.entry_listbox, self.room_entry_commands)
     
     def add_first_time_command(self):
         room = self.first_time_room_var.get()
@@ -745,7 +993,7 @@ class AdventureLibGUI:
             messagebox.showwarning("Input Error", "Please select a room")
             return
         self.room_first_time_commands[room] = self.first_time_code_text.get("1.0", tk.END).strip()
-        self.refresh_first_time_list()
+        self.schedule_refresh('first_time')
         self.first_time_code_text.delete("1.0", tk.END)
     
     def update_first_time_command(self):
@@ -760,7 +1008,7 @@ class AdventureLibGUI:
             self.room_first_time_commands[new_room] = self.room_first_time_commands.pop(old_room)
         
         self.room_first_time_commands[new_room] = self.first_time_code_text.get("1.0", tk.END).strip()
-        self.refresh_first_time_list()
+        self.schedule_refresh('first_time')
     
     def delete_first_time_command(self):
         selection = self.first_time_listbox.curselection()
@@ -769,7 +1017,7 @@ class AdventureLibGUI:
             return
         room = self.first_time_listbox.get(selection[0])
         del self.room_first_time_commands[room]
-        self.refresh_first_time_list()
+        self.schedule_refresh('first_time')
     
     def on_first_time_select(self, event):
         selection = self.first_time_listbox.curselection()
@@ -780,9 +1028,7 @@ class AdventureLibGUI:
             self.first_time_code_text.insert("1.0", self.room_first_time_commands[room])
     
     def refresh_first_time_list(self):
-        self.first_time_listbox.delete(0, tk.END)
-        for room in self.room_first_time_commands:
-            self.first_time_listbox.insert(tk.END, room)
+        self.set_list_values(self.first_time_listbox, self.room_first_time_commands)
     
     # Items management
     def add_item(self):
@@ -798,8 +1044,7 @@ class AdventureLibGUI:
         self.item_locations[name] = self.item_room_var.get()
         self.item_keys[name] = self.item_is_key_var.get()
         
-        self.refresh_items_list()
-        self.refresh_key_combos()
+        self.schedule_refresh('items', 'keys')
         self.item_name_entry.delete(0, tk.END)
         self.item_desc_text.delete("1.0", tk.END)
         self.item_room_var.set("")
@@ -823,7 +1068,7 @@ class AdventureLibGUI:
             'gift': [g.strip() for g in self.npc_gift_entry.get().split(',') if g.strip()]
         }
         self.npc_locations[name] = self.npc_room_var.get()
-        self.refresh_npc_list()
+        self.schedule_refresh('npcs')
         self.npc_name_entry.delete(0, tk.END)
         self.npc_words_text.delete("1.0", tk.END)
         self.npc_detail_text.delete("1.0", tk.END)
@@ -855,7 +1100,7 @@ class AdventureLibGUI:
             'gift': [g.strip() for g in self.npc_gift_entry.get().split(',') if g.strip()]
         }
         self.npc_locations[new_name] = self.npc_room_var.get()
-        self.refresh_npc_list()
+        self.schedule_refresh('npcs')
 
     def delete_npc(self):
         selection = self.npc_listbox.curselection()
@@ -867,7 +1112,7 @@ class AdventureLibGUI:
             del self.npcs[name]
         if name in self.npc_locations:
             del self.npc_locations[name]
-        self.refresh_npc_list()
+        self.schedule_refresh('npcs')
 
     def on_npc_select(self, event):
         selection = self.npc_listbox.curselection()
@@ -891,9 +1136,7 @@ class AdventureLibGUI:
             self.npc_room_var.set(self.npc_locations.get(name, ""))
 
     def refresh_npc_list(self):
-        self.npc_listbox.delete(0, tk.END)
-        for n in self.npcs:
-            self.npc_listbox.insert(tk.END, n)
+        self.set_list_values(self.npc_listbox, self.npcs)
     
     def update_item(self):
         selection = self.items_listbox.curselection()
@@ -918,8 +1161,7 @@ class AdventureLibGUI:
         self.item_locations[new_name] = self.item_room_var.get()
         self.item_keys[new_name] = self.item_is_key_var.get()
         
-        self.refresh_items_list()
-        self.refresh_key_combos()
+        self.schedule_refresh('items', 'keys')
     
     def delete_item(self):
         selection = self.items_listbox.curselection()
@@ -934,8 +1176,7 @@ class AdventureLibGUI:
         if name in self.item_keys:
             del self.item_keys[name]
         
-        self.refresh_items_list()
-        self.refresh_key_combos()
+        self.schedule_refresh('items', 'keys')
     
     def on_item_select(self, event):
         selection = self.items_listbox.curselection()
@@ -949,32 +1190,24 @@ class AdventureLibGUI:
             self.item_is_key_var.set(self.item_keys.get(name, False))
     
     def refresh_items_list(self):
-        self.items_listbox.delete(0, tk.END)
-        for item in self.items:
-            is_key = " [KEY]" if self.item_keys.get(item, False) else ""
-            self.items_listbox.insert(tk.END, f"{item}{is_key}")
+        self.set_list_values(self.items_listbox, [
+            f"{item} [KEY]" if self.item_keys.get(item, False) else item
+            for item in self.items
+        ])
     
     def refresh_key_combos(self):
         # Get list of keys (items marked as keys)
-        keys_list = [item for item in self.items if self.item_keys.get(item, False)]
-        try:
-            self.locked_north_key_combo['values'] = keys_list
-            self.locked_south_key_combo['values'] = keys_list
-            self.locked_east_key_combo['values'] = keys_list
-            self.locked_west_key_combo['values'] = keys_list
-        except Exception:
-            pass
+        keys_list = tuple(item for item in self.items if self.item_keys.get(item, False))
+        for combo in (self.locked_north_key_combo, self.locked_south_key_combo,
+                      self.locked_east_key_combo, self.locked_west_key_combo):
+            self.set_list_values(combo, keys_list)
         # Also include keys as possible NPC gift items (no UI control needed here)
     
-    def update_room_combo(self):
-        self.entry_room_combo['values'] = list(self.rooms.keys())
-        self.first_time_room_combo['values'] = list(self.rooms.keys())
-        self.item_room_combo['values'] = list(self.rooms.keys())
-        # also keep exit targets updated
-        try:
-            self.exit_target_combo['values'] = list(self.rooms.keys())
-        except Exception:
-            pass
+    def update_room_combo(self, names):
+        for combo in (self.entry_room_combo, self.first_time_room_combo,
+                      self.item_room_combo, self.exit_target_combo,
+                      self.npc_room_combo):
+            self.set_list_values(combo, names)
 
     # Exits management
     def add_exit(self):
@@ -988,9 +1221,12 @@ class AdventureLibGUI:
         if not target or target not in self.rooms:
             messagebox.showwarning("Input Error", "Select a valid target room")
             return
-        self.room_exits.setdefault(room, {})[direction] = target
-        self.refresh_exits_list()
-        self.draw_graph()
+        exits = self.room_exits.setdefault(room, {})
+        if direction in exits:
+            self.layout.remove_exit(room, direction, exits[direction])
+        exits[direction] = target
+        self.layout.add_exit(room, direction, target, self.room_exits)
+        self.schedule_refresh('exits', 'graph')
 
     def delete_exit(self):
         sel = self.room_listbox.curselection()
@@ -1006,118 +1242,197 @@ class AdventureLibGUI:
         # entry format: "north -> target"
         direction = entry.split()[0]
         if room in self.room_exits and direction in self.room_exits[room]:
-            del self.room_exits[room][direction]
-        self.refresh_exits_list()
-        self.draw_graph()
+            self.layout.remove_exit(room, direction, self.room_exits[room].pop(direction))
+        self.schedule_refresh('exits', 'graph')
 
     def refresh_exits_list(self):
-        self.exits_listbox.delete(0, tk.END)
         sel = self.room_listbox.curselection()
-        if not sel:
-            return
-        room = self.room_listbox.get(sel[0])
-        exits = self.room_exits.get(room, {})
-        for d, t in exits.items():
-            self.exits_listbox.insert(tk.END, f"{d} -> {t}")
+        exits = self.room_exits.get(self.room_listbox.get(sel[0]), {}) if sel else {}
+        self.set_list_values(self.exits_listbox, [f"{d} -> {t}" for d, t in exits.items()])
 
     # Canvas graph drawing
-    def draw_graph(self):
-        self.canvas.delete('all')
-        if not self.rooms:
-            return
+    def current_view(self):
+        w = int(self.canvas.winfo_width() or 800)
+        h = int(self.canvas.winfo_height() or 250)
+        return (w//2 + self.canvas_offset_x, h//2 + self.canvas_offset_y, self.canvas_zoom)
 
-        # compute grid positions using BFS starting from 'start' or first room
-        dirs = {'north':(0,-1),'south':(0,1),'east':(1,0),'west':(-1,0)}
-        positions = {}
-        from collections import deque
-        try:
-            start = 'start' if 'start' in self.rooms else next(iter(self.rooms))
-        except StopIteration:
+    def move_view(self):
+        # Bring the existing canvas items to the current pan/zoom by moving
+        # and scaling them in place, rather than drawing them again
+        view = self.current_view()
+        if self.drawn_view is None:
+            self.drawn_view = view
             return
-        positions[start] = (0,0)
-        q = deque([start])
-        while q:
-            r = q.popleft()
-            x,y = positions[r]
-            for d, tgt in self.room_exits.get(r, {}).items():
-                if tgt not in positions:
-                    dx,dy = dirs.get(d,(0,0))
-                    positions[tgt] = (x+dx, y+dy)
-                    q.append(tgt)
-
-        # place any unpositioned rooms nearby
-        cur_x = 0
-        for r in self.rooms:
-            if r not in positions:
-                cur_x += 1
-                positions[r] = (cur_x, 0)
+        if view == self.drawn_view:
+            return
+        cx, cy, zoom = view
+        old_cx, old_cy, old_zoom = self.drawn_view
+        if zoom != old_zoom:
+            factor = zoom / old_zoom
+            self.canvas.scale('graph', old_cx, old_cy, factor, factor)
+            self.canvas.itemconfigure('edge', width=max(1, int(2*zoom)))
+            if (zoom >= DETAIL_ZOOM) != (old_zoom >= DETAIL_ZOOM):
+                detail = zoom >= DETAIL_ZOOM
+                self.canvas.itemconfigure('label', state=tk.NORMAL if detail else tk.HIDDEN)
+                self.canvas.itemconfigure('edge', arrow=tk.LAST if detail else tk.NONE)
+        if (cx, cy) != (old_cx, old_cy):
+            self.canvas.move('graph', cx - old_cx, cy - old_cy)
+        self.drawn_view = view
 
-        # draw nodes (with pan/zoom applied)
+    def visible_window(self):
+        # grid cells in view, with a cell of margin on each side so rooms
+        # are already drawn as they are panned into view
+        cx, cy, zoom = self.drawn_view
+        cell = CELL_SIZE * zoom
         w = int(self.canvas.winfo_width() or 800)
         h = int(self.canvas.winfo_height() or 250)
-        cell = 140
-        cx = w//2 + self.canvas_offset_x
-        cy = h//2 + self.canvas_offset_y
-        node_coords = {}
-        for r, (gx,gy) in positions.items():
-            px = cx + int(gx*cell*self.canvas_zoom)
-            py = cy + int(gy*cell*self.canvas_zoom)
-            node_size = int(50 * self.canvas_zoom)
-            nw = px - node_size
-            nh = py - int(25 * self.canvas_zoom)
-            se = px + node_size
-            se_y = py + int(25 * self.canvas_zoom)
-            rect = self.canvas.create_rectangle(nw, nh, se, se_y, fill="#444444", outline="#ffffff", width=2, tags=(f"node:{r}",))
-            text = self.canvas.create_text(px, py, text=r, fill="#ffffff", tags=(f"node:{r}",))
-            node_coords[r] = (px, py)
-
-        # draw edges
-        for r, exits in self.room_exits.items():
-            src = node_coords.get(r)
-            if not src:
+        return (math.floor(-cx / cell) - 1, math.floor(-cy / cell) - 1,
+                math.ceil((w - cx) / cell) + 1, math.ceil((h - cy) / cell) + 1)
+
+    def update_view(self):
+        self.move_view()
+        if self.drawn_view is not None and self.visible_window() != self.drawn_window:
+            self.schedule_refresh('graph')
+
+    def draw_graph(self):
+        # Sync the canvas with the model for the rooms in view: only rooms
+        # and exits that were added, removed, moved, or panned into or out
+        # of view since the last call touch the canvas
+        positions = self.layout.positions
+        self.move_view()
+        cx, cy, zoom = self.drawn_view
+        cell = CELL_SIZE * zoom
+        half_w = 50 * zoom
+        half_h = 25 * zoom
+        detail = zoom >= DETAIL_ZOOM
+        self.drawn_window = self.visible_window()
+        visible = self.layout.rooms_in(*self.drawn_window)
+        in_view = set(visible)
+
+        for r in list(self.node_items):
+            if r not in in_view:
+                rect, text, _ = self.node_items.pop(r)
+                self.canvas.delete(rect, text)
+
+        created = False
+        for r in visible:
+            gx, gy = positions[r]
+            px = cx + gx*cell
+            py = cy + gy*cell
+            entry = self.node_items.get(r)
+            if entry is None:
+                rect = self.canvas.create_rectangle(px - half_w, py - half_h, px + half_w, py + half_h, fill="#444444", outline="#ffffff", width=2, tags=('graph', 'node'))
+                text = self.canvas.create_text(px, py, text=r, fill="#ffffff", state=tk.NORMAL if detail else tk.HIDDEN, tags=('graph', 'node', 'label'))
+                self.node_items[r] = [rect, text, (gx,gy)]
+                created = True
+            elif entry[2] != (gx,gy):
+                self.canvas.coords(entry[0], px - half_w, py - half_h, px + half_w, py + half_h)
+                self.canvas.coords(entry[1], px, py)
+                entry[2] = (gx,gy)
+
+        # exits leading out of or into a room in view are drawn; they are
+        # keyed by (room, direction) and remember the grid positions of both
+        # ends, so they only move when an end moves
+        edges = {}
+        for r in visible:
+            for d, tgt in self.room_exits.get(r, {}).items():
+                if tgt in positions:
+                    edges[(r, d)] = (positions[r], positions[tgt])
+            for src, d in self.layout.incoming.get(r, ()):
+                if src in positions:
+                    edges[(src, d)] = (positions[src], positions[r])
+        for key in list(self.edge_items):
+            if key not in edges:
+                self.canvas.delete(self.edge_items.pop(key)[0])
+        for key, ends in edges.items():
+            entry = self.edge_items.get(key)
+            if entry is not None and entry[1] == ends:
                 continue
-            sx, sy = src
-            for d, tgt in exits.items():
-                dst = node_coords.get(tgt)
-                if not dst:
-                    continue
-                dx, dy = dst
-                self.canvas.create_line(sx, sy, dx, dy, arrow=tk.LAST, fill="#88ff88", width=max(1, int(2*self.canvas_zoom)))
+            (sx, sy), (tx, ty) = ends
+            coords = (cx + sx*cell, cy + sy*cell, cx + tx*cell, cy + ty*cell)
+            if entry is None:
+                line = self.canvas.create_line(*coords, arrow=tk.LAST if detail else tk.NONE, fill="#88ff88", width=max(1, int(2*zoom)), tags=('graph', 'edge'))
+                self.edge_items[key] = [line, ends]
+                created = True
+            else:
+                self.canvas.coords(entry[0], *coords)
+                entry[1] = ends
+        if created:
+            # edges are drawn over the room boxes
+            self.canvas.tag_raise('edge')
+
+    def room_at(self, x, y):
+        # Hit-test through the layout's cell index: a room box is smaller
+        # than a grid cell, so only rooms in the nearest cell can be hit
+        if self.drawn_view is None:
+            return None
+        cx, cy, zoom = self.drawn_view
+        cell = CELL_SIZE * zoom
+        gx = round((x - cx) / cell)
+        gy = round((y - cy) / cell)
+        if abs(x - (cx + gx*cell)) > 50*zoom or abs(y - (cy + gy*cell)) > 25*zoom:
+            return None
+        here = self.layout.cells.get((gx, gy))
+        # the last room placed in a cell is drawn on top
+        return here[-1] if here else None
+
+    def rooms_in_rect(self, x0, y0, x1, y1):
+        # rooms whose box overlaps the canvas rectangle
+        cx, cy, zoom = self.drawn_view
+        cell = CELL_SIZE * zoom
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((y0, y1))
+        return self.layout.rooms_in(
+            math.ceil((x0 - cx - 50*zoom) / cell), math.ceil((y0 - cy - 25*zoom) / cell),
+            math.floor((x1 - cx + 50*zoom) / cell), math.floor((y1 - cy + 25*zoom) / cell))
+
+    def select_rooms(self, names):
+        rows = sorted(self.room_rows[n] for n in names if n in self.room_rows)
+        self.room_listbox.selection_clear(0, tk.END)
+        for row in rows:
+            self.room_listbox.selection_set(row)
+        if rows:
+            self.room_listbox.see(rows[0])
+            self.on_room_select(None)
 
     def on_canvas_button_down(self, event):
         # Check if we clicked on a node
-        items = self.canvas.find_overlapping(event.x, event.y, event.x, event.y)
-        for it in items:
-            tags = self.canvas.gettags(it)
-            for t in tags:
-                if t.startswith('node:'):
-                    name = t.split(':',1)[1]
-                    # select in listbox
-                    try:
-                        idx = list(self.rooms.keys()).index(name)
-                    except ValueError:
-                        idx = None
-                    if idx is not None:
-                        self.room_listbox.selection_clear(0, tk.END)
-                        self.room_listbox.selection_set(idx)
-                        self.room_listbox.see(idx)
-                        self.on_room_select(None)
-                    self.pan_start = None  # Don't pan if clicked a node
-                    return
+        name = self.room_at(event.x, event.y)
+        if name is not None:
+            # select in listbox
+            self.select_rooms([name])
+            self.pan_start = None  # Don't pan if clicked a node
+            return
         # Not on a node, start panning
         self.pan_start = (event.x, event.y)
 
+    def on_select_start(self, event):
+        self.pan_start = None
+        if self.drawn_view is None:
+            return
+        self.select_start = (event.x, event.y)
+        self.canvas.delete('selection')
+        self.canvas.create_rectangle(event.x, event.y, event.x, event.y, outline="#ffff88", dash=(4, 2), tags=('selection',))
+
     def on_pan_motion(self, event):
-        if self.pan_start:
+        if self.select_start:
+            x0, y0 = self.select_start
+            self.canvas.coords('selection', x0, y0, event.x, event.y)
+        elif self.pan_start:
             dx = event.x - self.pan_start[0]
             dy = event.y - self.pan_start[1]
             self.canvas_offset_x += dx
             self.canvas_offset_y += dy
             self.pan_start = (event.x, event.y)
-            self.draw_graph()
+            self.update_view()
 
     def on_pan_end(self, event):
         self.pan_start = None
+        if self.select_start:
+            x0, y0 = self.select_start
+            self.select_start = None
+            self.canvas.delete('selection')
+            self.select_rooms(self.rooms_in_rect(x0, y0, event.x, event.y))
 
     def on_canvas_scroll(self, event):
         # Zoom on scroll
@@ -1126,7 +1441,7 @@ class AdventureLibGUI:
         elif event.num == 5 or event.delta < 0:  # scroll down
             self.canvas_zoom /= 1.1
         self.canvas_zoom = max(0.3, min(3.0, self.canvas_zoom))  # clamp
-        self.draw_graph()
+        self.update_view()
     
     def refresh_preview(self):
         code = self.generate_python_code()
@@ -1226,9 +1541,13 @@ class AdventureLibGUI:
             code += "                for g in gifts:\n"
             code += "                    try:\n"
             code += "                        inventory.add(g)\n"
+            if start_room:
+                code += "                        journal.record('add', 'inventory', g)\n"
             code += "                        # remove from room if present\n"
             code += "                        if g in item_locations.get(current_room, []):\n"
             code += "                            item_locations[current_room].remove(g)\n"
+            if start_room:
+                code += "                            journal.record('remove', ('item_locations', current_room), g)\n"
             code += "                    except Exception:\n"
             code += "                        pass\n"
             code += "        else:\n"
@@ -1281,6 +1600,8 @@ class AdventureLibGUI:
             code += "    room_name = str(current_room)\n"
             code += "    if room_name not in visited_rooms:\n"
             code += "        visited_rooms.add(room_name)\n"
+            if start_room:
+                code += "        journal.record('add', 'visited_rooms', room_name)\n"
             for room_name, action_code in self.room_first_time_commands.items():
                 if room_name in id_map:
                     code += f"        if current_room == {id_map[room_name]}:\n"
@@ -1334,6 +1655,8 @@ class AdventureLibGUI:
                 code += f"    npcs_here = npc_locations.get(current_room, [])\n"
                 code += f"    if {var} in npcs_here:\n"
                 code += f"        last_questioned = {var}\n"
+                if start_room:
+                    code += f"        journal.record('set', 'last_questioned', {var})\n"
                 code += f"        {var}.ask_question()\n"
                 code += f"    else:\n"
                 code += f"        say(\"I don't see that here.\")\n\n"
@@ -1410,6 +1733,8 @@ class AdventureLibGUI:
             code += "    room = current_room.exit(direction)\n"
             code += "    if room:\n"
             code += "        current_room = room\n"
+            if start_room:
+                code += "        journal.record('set', 'current_room', current_room)\n"
             code += "        say('You go %s.' % direction)\n"
             code += "        say(current_room)\n"
             code += "        room_items = item_locations.get(current_room, [])\n"
@@ -1437,6 +1762,8 @@ class AdventureLibGUI:
             code += "    room = current_room.exit(direction)\n"
             code += "    if room:\n"
             code += "        current_room = room\n"
+            if start_room:
+                code += "        journal.record('set', 'current_room', current_room)\n"
             code += "        say('You go %s.' % direction)\n"
             code += "        say(current_room)\n"
             if self.room_entry_commands:
@@ -1525,8 +1852,12 @@ class AdventureLibGUI:
             code += "    room_items = item_locations.get(current_room, [])\n"
             code += "    if item in room_items:\n"
             code += "        inventory.add(item)\n"
+            if start_room:
+                code += "        journal.record('add', 'inventory', item)\n"
             code += "        say(f\"You take the {item}.\")\n"
             code += "        item_locations[current_room].remove(item)\n"
+            if start_room:
+                code += "        journal.record('remove', ('item_locations', current_room), item)\n"
             code += "    else:\n"
             code += "        say(f\"I don't see that here.\")\n"
             code += "\n"
@@ -1549,6 +1880,56 @@ class AdventureLibGUI:
             code += "        say(\"You don't see that.\")\n"
             code += "\n"
 
+        # Save/load of the live game state: each change is appended to a
+        # journal, which is compacted into a binary snapshot now and then
+        if start_room:
+            state_names = ['current_room', 'visited_rooms', 'item_locations']
+            if self.items:
+                state_names.append('inventory')
+            if self.npcs:
+                state_names.append('last_questioned')
+            code += "# Saved games, kept next to this script\n"
+            code += "import os\n"
+            code += "SAVE_FILE = os.path.splitext(os.path.abspath(__file__))[0] + '.sav'\n"
+            code += "game_objects = {\n"
+            for room_id in id_map.values():
+                code += f"    'room:{room_id}': {room_id},\n"
+            if self.npcs:
+                for var in npc_var_map.values():
+                    code += f"    'npc:{var}': {var},\n"
+            code += "}\n\n"
+            code += "def _game_state():\n"
+            code += "    return {\n"
+            for name in state_names:
+                code += f"        '{name}': {name},\n"
+            code += "    }\n\n"
+            code += "journal = Journal(SAVE_FILE, game_objects, state=_game_state)\n"
+            code += "# The journal is replayed over the state before any play\n"
+            code += "initial_state = restore(snapshot(_game_state(), game_objects), game_objects)\n\n"
+            code += "def _set_state(state):\n"
+            code += f"    global {', '.join(state_names)}\n"
+            for name in state_names:
+                code += f"    {name} = state['{name}']\n"
+            code += "\n"
+            code += "def _load_state():\n"
+            code += "    state = journal.load(initial_state)\n"
+            code += "    if state is None:\n"
+            code += "        return False\n"
+            code += "    _set_state(state)\n"
+            code += "    return True\n\n"
+            code += "@when('save')\n"
+            code += "def save_game():\n"
+            code += "    journal.compact()\n"
+            code += "    say('Game saved.')\n\n"
+            code += "@when('new game')\n"
+            code += "def new_game():\n"
+            code += "    journal.start_new()  # The old save is kept as a backup\n"
+            code += "    _set_state(restore(snapshot(initial_state, game_objects), game_objects))\n"
+            code += "    say('Starting a new game.')\n"
+            if self.room_first_time_commands:
+                code += "    handle_first_time_entry()\n"
+            code += "    say(current_room)\n\n"
+
         code += "# Room entry action handlers (called by handle_room_entry())\n"
         for room in self.room_entry_commands:
             fn = room.lower().replace(' ', '_')
@@ -1559,7 +1940,20 @@ class AdventureLibGUI:
             code += "\n"
 
         code += "# Start the game\n"
-        if self.room_first_time_commands:
+        if start_room:
+            code += "try:\n"
+            code += "    resumed = _load_state()  # Continue an autosaved game\n"
+            code += "except ValueError as e:\n"
+            code += "    say(f'Could not load the saved game: {e}')\n"
+            code += "    say(f'It will be kept as {SAVE_FILE}.bak.')\n"
+            code += "    resumed = False\n"
+            code += "if resumed:\n"
+            code += "    say(\"Continuing your saved game. Type 'new game' to start again.\")\n"
+            code += "    say(current_room)\n"
+            if self.room_first_time_commands:
+                code += "else:\n"
+                code += "    handle_first_time_entry()  # Run first-time action for starting room\n"
+        elif self.room_first_time_commands:
             code += "handle_first_time_entry()  # Run first-time action for starting room\n"
         code += "start()\n"
 
@@ -1573,6 +1967,127 @@ class AdventureLibGUI:
                 f.write(code)
             messagebox.showinfo("Success", f"Exported to {file_path}")
 
+    # Project files
+    def project_records(self):
+        # Header first, then one record per room/command/action/item/NPC
+        yield {'format': PROJECT_FORMAT, 'version': PROJECT_VERSION}
+        for name, desc in self.rooms.items():
+            record = {'type': 'room', 'name': name, 'desc': desc,
+                      'way': self.room_ways.get(name, "passage"),
+                      'exits': self.room_exits.get(name, {})}
+            locked = self.room_locked_directions.get(name)
+            if locked:
+                record['locked'] = sorted(locked)
+            # (room, direction) keys are stored with their room
+            keys = {d: self.room_direction_keys[(name, d)]
+                    for d in DIRECTIONS if (name, d) in self.room_direction_keys}
+            if keys:
+                record['keys'] = keys
+            yield record
+        for trigger, code in self.commands.items():
+            yield {'type': 'command', 'trigger': trigger, 'code': code}
+        for room, code in self.room_entry_commands.items():
+            yield {'type': 'entry', 'room': room, 'code': code}
+        for room, code in self.room_first_time_commands.items():
+            yield {'type': 'first_time', 'room': room, 'code': code}
+        for name, desc in self.items.items():
+            yield {'type': 'item', 'name': name, 'desc': desc,
+                   'room': self.item_locations.get(name, ""),
+                   'key': bool(self.item_keys.get(name, False))}
+        for name, data in self.npcs.items():
+            yield {'type': 'npc', 'name': name, 'data': data,
+                   'room': self.npc_locations.get(name, "")}
+
+    def write_project(self, file_path):
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.project_records():
+                f.write(encode(record))
+                f.write('\n')
+        os.replace(tmp_path, file_path)
+
+    def read_project(self, file_path):
+        # Build a new model line by line; it only replaces the current one
+        # once the whole file has been read without errors
+        decode = json.JSONDecoder().decode
+        rooms, room_ways, room_exits = {}, {}, {}
+        room_locked_directions, room_direction_keys = {}, {}
+        commands, room_entry_commands, room_first_time_commands = {}, {}, {}
+        items, item_locations, item_keys = {}, {}, {}
+        npcs, npc_locations = {}, {}
+        with open(file_path, encoding='utf-8') as f:
+            header = decode(f.readline() or 'null')
+            if not isinstance(header, dict) or header.get('format') != PROJECT_FORMAT:
+                raise ValueError("Not an AdventureLib project file")
+            if header.get('version') != PROJECT_VERSION:
+                raise ValueError(f"Unsupported project version: {header.get('version')}")
+            for line_no, line in enumerate(f, 2):
+                if not line.strip():
+                    continue
+                record = decode(line)
+                kind = record.get('type')
+                if kind == 'room':
+                    name = record['name']
+                    rooms[name] = record.get('desc', "")
+                    room_ways[name] = record.get('way', "passage")
+                    room_exits[name] = dict(record.get('exits', {}))
+                    if record.get('locked'):
+                        room_locked_directions[name] = set(record['locked'])
+                    for direction, key in record.get('keys', {}).items():
+                        room_direction_keys[(name, direction)] = key
+                elif kind == 'command':
+                    commands[record['trigger']] = record['code']
+                elif kind == 'entry':
+                    room_entry_commands[record['room']] = record['code']
+                elif kind == 'first_time':
+                    room_first_time_commands[record['room']] = record['code']
+                elif kind == 'item':
+                    name = record['name']
+                    items[name] = record.get('desc', "")
+                    item_locations[name] = record.get('room', "")
+                    item_keys[name] = bool(record.get('key', False))
+                elif kind == 'npc':
+                    npcs[record['name']] = dict(record['data'])
+                    npc_locations[record['name']] = record.get('room', "")
+                else:
+                    raise ValueError(f"Unknown record type {kind!r} on line {line_no}")
+
+        self.rooms, self.room_ways, self.room_exits = rooms, room_ways, room_exits
+        self.room_locked_directions = room_locked_directions
+        self.room_direction_keys = room_direction_keys
+        self.commands = commands
+        self.room_entry_commands = room_entry_commands
+        self.room_first_time_commands = room_first_time_commands
+        self.items, self.item_locations, self.item_keys = items, item_locations, item_keys
+        self.npcs, self.npc_locations = npcs, npc_locations
+        self.layout.rebuild(self.rooms, self.room_exits)
+
+    def save_project(self):
+        file_path = filedialog.asksaveasfilename(defaultextension=".advproj", filetypes=[("AdventureLib projects", "*.advproj")])
+        if file_path:
+            try:
+                self.write_project(file_path)
+            except OSError as e:
+                messagebox.showerror("Error", f"Could not save project: {e}")
+                return
+            messagebox.showinfo("Success", f"Saved project to {file_path}")
+
+    def open_project(self):
+        file_path = filedialog.askopenfilename(filetypes=[("AdventureLib projects", "*.advproj"), ("All files", "*.*")])
+        if not file_path:
+            return
+        try:
+            self.read_project(file_path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            messagebox.showerror("Error", f"Could not open project: {e}")
+            return
+        self.canvas_offset_x = 0
+        self.canvas_offset_y = 0
+        self.canvas_zoom = 1.0
+        self.schedule_refresh('rooms', 'exits', 'graph', 'commands', 'entries',
+                              'first_time', 'items', 'keys', 'npcs')
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = AdventureLibGUI(root)
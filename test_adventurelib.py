@@ -0,0 +1,376 @@
+from adventurelib import (
+    Room, Item, Bag, Journal, Session, snapshot, restore,
+    Pattern, Placeholder, connected_components,
+)
+
+
+def test_room_class_bag_copied_per_room():
+    """A Bag set on Room after it is defined is copied into each room."""
+    Room.items = Bag()
+    try:
+        a, b = Room('a'), Room('b')
+        a.items.add(Item('lamp'))
+        assert a.items is not b.items
+        assert 'lamp' not in b.items
+        assert 'lamp' not in Room.items
+    finally:
+        del Room.items
+
+
+def test_subclass_bag_assigned_later_copied_per_room():
+    class Cave(Room):
+        pass
+
+    Cave.stuff = Bag()
+    a, b = Cave('a'), Cave('b')
+    a.stuff.add(Item('rope'))
+    assert 'rope' not in b.stuff
+
+
+def test_subclass_body_bag_copied_per_room():
+    class Cave(Room):
+        gems = Bag([Item('ruby')])
+
+    a, b = Cave('a'), Cave('b')
+    a.gems.take('ruby')
+    assert 'ruby' in b.gems
+    assert 'ruby' in Cave.gems
+
+
+def test_room_class_bag_copied_on_first_access():
+    class Cave(Room):
+        gems = Bag()
+
+    read, unread = Cave('read'), Cave('unread')
+    assert not read.gems
+    Cave.gems.add(Item('ruby'))
+    assert 'ruby' not in read.gems
+    assert 'ruby' in unread.gems
+
+
+def test_journal_load_replays_over_initial_state(tmp_path):
+    hall = Room('hall')
+    objects = {'room:hall': hall}
+    initial = {'inventory': set(), 'item_locations': {hall: ['lamp']}}
+    live = {'inventory': set(), 'item_locations': {hall: ['lamp']}}
+    journal = Journal(str(tmp_path / 'save.dat'), objects)
+
+    live['item_locations'][hall].remove('lamp')
+    journal.record('remove', ('item_locations', hall), 'lamp')
+    live['inventory'].add('lamp')
+    journal.record('add', 'inventory', 'lamp')
+
+    for _ in range(2):
+        assert journal.load(initial) == live
+    assert initial['item_locations'][hall] == ['lamp']
+    journal.close()
+
+
+def test_restore_truncated_data_raises_value_error():
+    data = snapshot({'n': 1, 'name': 'lamp'}, {})
+    for end in range(len(data)):
+        try:
+            restore(data[:end], {})
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('restore accepted %r' % data[:end])
+
+
+def test_journal_load_ignores_truncated_header(tmp_path):
+    path = str(tmp_path / 'save.dat')
+    with open(path + '.journal', 'wb') as f:
+        f.write(b'ALJR')
+    journal = Journal(path, {})
+    assert journal.load({'n': 1}) is None
+    journal.close()
+
+
+def test_connected_components_follows_exits_outward():
+    a, b, c, d = Room('a'), Room('b'), Room('c'), Room('d')
+    a.north = b
+    b.east = c
+    assert connected_components([a]) == [{a, b, c}]
+    assert sorted(map(len, connected_components([a, d]))) == [1, 3]
+
+
+def test_bag_copy_module_does_not_share_indexes():
+    import copy
+    b = Bag([Item('lamp'), Item('rope')])
+    c = copy.copy(b)
+    taken = c.take_random()
+    assert taken in b
+    for _ in range(20):
+        assert b.get_random() in b
+    assert len(b) == 2 and len(c) == 1
+
+
+def test_session_context_argument():
+    session = Session(context='bar')
+    assert session.get_context() == 'bar'
+    assert Session().get_context() is None
+
+
+def test_session_rejects_reserved_state_names():
+    for name in ('say', 'activated', 'context_node'):
+        try:
+            Session(**{name: 1})
+        except TypeError:
+            pass
+        else:
+            raise AssertionError('Session accepted %r' % name)
+
+
+def test_journal_compacts_between_commands(tmp_path):
+    import adventurelib
+    hall = Room('hall')
+    objects = {'room:hall': hall}
+    names = ['lamp', 'rope']
+    state = {'inventory': set(), 'item_locations': {hall: list(names)}}
+    initial = restore(snapshot(state, objects), objects)
+    journal = Journal(str(tmp_path / 'save.dat'), objects,
+                      state=lambda: state, compact_every=3)
+
+    def take(item):
+        state['inventory'].add(item)
+        state['item_locations'][hall].remove(item)
+        journal.record('add', 'inventory', item)
+        journal.record('remove', ('item_locations', hall), item)
+
+    registry = []
+    adventurelib._register('take ITEM', take, registry=registry)
+    session = Session(commands=registry)
+    for _ in adventurelib.run_commands(
+            ['take %s' % n for n in names], help=False, session=session):
+        pass
+    assert journal.generation == 1
+    assert journal.load(initial) == state
+    journal.close()
+
+
+def test_journal_new_game_keeps_old_save(tmp_path):
+    path = str(tmp_path / 'save.dat')
+    with open(path, 'wb') as f:
+        f.write(b'not a save')
+    journal = Journal(path, {})
+    try:
+        journal.load({})
+    except ValueError:
+        pass
+    journal.record('set', 'n', 1)
+    journal.close()
+    with open(path + '.bak', 'rb') as f:
+        assert f.read() == b'not a save'
+    journal = Journal(path, {})
+    assert journal.load({}) == {'n': 1}
+    journal.close()
+
+
+def test_context_assigned_directly():
+    import adventurelib
+    from adventurelib import run_commands, when, set_context
+
+    @when('bye', context='x')
+    def bye():
+        print('bye!')
+
+    try:
+        adventurelib.current_context = 'x'
+        assert list(run_commands(['bye'], help=False)) == [('bye', 'bye!\n\n')]
+        set_context('x')
+        assert list(run_commands(['bye'], help=False)) == [('bye', 'bye!\n\n')]
+        adventurelib.current_context = None
+        [(_, out)] = run_commands(['bye'], help=False)
+        assert 'bye!' not in out
+    finally:
+        set_context(None)
+        adventurelib.commands.pop()
+        adventurelib._invalidate_commands()
+
+
+def test_default_session_follows_rebound_commands():
+    from unittest.mock import patch
+    from adventurelib import run_commands, when
+
+    with patch('adventurelib.commands', []):
+        @when('jump')
+        def jump():
+            print('You jump.')
+
+        assert list(run_commands(['jump'], help=False)) == [
+            ('jump', 'You jump.\n\n')
+        ]
+
+
+def _match_by_combinations(pattern, input_words):
+    """Match the way Pattern.match() did before it was made linear."""
+    input_words = list(input_words)
+    if len(input_words) < len(pattern.argnames):
+        return None
+    if input_words[:len(pattern.prefix)] != list(pattern.prefix):
+        return None
+    input_words = input_words[len(pattern.prefix):]
+    if not input_words and not pattern.pattern:
+        return {}
+    if bool(input_words) != bool(pattern.pattern):
+        return None
+    have = len(input_words) - pattern.fixed
+    for combo in pattern.word_combinations(have, pattern.placeholders):
+        matches = {}
+        take = iter(combo)
+        inp = iter(input_words)
+        try:
+            for cword in pattern.pattern:
+                if isinstance(cword, Placeholder):
+                    matches[cword.name] = [next(inp) for _ in range(next(take))]
+                elif next(inp) != cword:
+                    break
+            else:
+                return {k: ' '.join(v) for k, v in matches.items()}
+        except StopIteration:
+            continue
+    return None
+
+
+def test_match_agrees_with_word_combinations():
+    import itertools
+    patterns = [
+        'A x B', 'A x B x C', 'give A to B', 'A x x B', 'x A x', 'A B',
+        'A x B C', 'put A in B in C', 'x', 'A',
+    ]
+    for p in patterns:
+        pattern = Pattern(p)
+        vocab = sorted({w for w in p.split() if w.islower()} | {'y'})
+        for n in range(7):
+            for words in itertools.product(vocab, repeat=n):
+                assert pattern.match(words) == _match_by_combinations(
+                    pattern, words), (p, words)
+
+
+def test_command_cache_invalidation():
+    import io
+
+    out = io.StringIO()
+    registry = []
+    alice = Session(commands=registry, output=out)
+    bob = Session(commands=registry, output=out, context='boat')
+
+    def run(session, cmd):
+        out.seek(0)
+        out.truncate()
+        session.handle_command(cmd)
+        return out.getvalue().strip()
+
+    assert run(alice, 'row') == "I don't understand 'row'."
+
+    # Registering a command discards cached tables and resolved inputs
+    @alice.when('row', context='boat')
+    def row():
+        print('You row.')
+
+    assert run(alice, 'row') == "I don't understand 'row'."
+    assert run(bob, 'row') == 'You row.'
+
+    # Changing context looks up input again in the new context
+    alice.set_context('boat.deck')
+    assert run(alice, 'row') == 'You row.'
+    alice.set_context(None)
+    assert run(alice, 'row') == "I don't understand 'row'."
+
+    # Each session is matched in its own context
+    for _ in range(2):
+        assert run(bob, 'row') == 'You row.'
+        assert run(alice, 'row') == "I don't understand 'row'."
+
+
+def test_handler_signature_checked_on_first_command():
+    import io
+    from adventurelib import InvalidCommand
+
+    out = io.StringIO()
+    session = Session(commands=[], output=out)
+
+    @session.when('take ITEM')
+    def take(thing):
+        pass
+
+    @session.when('look')
+    def look():
+        print('You look.')
+
+    try:
+        session.handle_command('look')
+    except InvalidCommand as e:
+        assert 'take(thing)' in str(e)
+    else:
+        raise AssertionError('InvalidCommand not raised')
+    assert [p.orig_pattern for p, _, _ in session.commands] == ['look']
+    session.handle_command('look')
+    assert out.getvalue().strip() == 'You look.'
+
+
+def test_command_table_round_trip(tmp_path):
+    from unittest.mock import patch
+    import adventurelib
+    from adventurelib import save_command_table, load_command_table
+
+    path = str(tmp_path / 'commands.json')
+    sources = [('take ITEM', None), ('give ITEM to NPC', 'shop'),
+               ('look', None), ('put A in B', 'shop.counter')]
+    with patch('adventurelib.commands', []), \
+            patch.dict('adventurelib._pattern_table', clear=True):
+        for command, context in sources:
+            pattern = Pattern(command, context)
+            pattern.compile()
+            adventurelib.commands.append((pattern, None, {}))
+        save_command_table(path)
+        adventurelib._pattern_table.clear()
+        assert load_command_table(path)
+        for command, context in sources:
+            loaded = adventurelib._pattern_table[command, context]
+            parsed = Pattern(command, context)
+            assert loaded.to_table() == parsed.to_table()
+            assert loaded.argnames == parsed.argnames
+            assert loaded.is_active() == parsed.is_active()
+            words = tuple(command.lower().split())
+            assert loaded.match(words) == parsed.match(words)
+    assert not load_command_table(str(tmp_path / 'missing.json'))
+
+
+def test_snapshot_round_trip():
+    hall, cellar = Room('hall'), Room('cellar')
+    lamp, rope = Item('lamp'), Item('rope')
+    objects = {'room:hall': hall, 'room:cellar': cellar,
+               'item:lamp': lamp, 'item:rope': rope}
+    state = {
+        'current_room': hall,
+        'flags': [None, True, False],
+        'numbers': [0, 1, -1, 2 ** 70, -(2 ** 70), 1.5, -0.0],
+        'names': ['lamp', 'lamp', '', 'caf\xe9', 'lamp'],
+        'visited': {'hall', 'cellar'},
+        'path': (hall, cellar),
+        'inventory': Bag([lamp]),
+        'item_locations': {hall: [rope], cellar: []},
+        'nested': {'a': {'b': [{'c': (1, 'lamp')}]}},
+    }
+    data = snapshot(state, objects)
+    restored = restore(data, objects)
+    assert restored == state
+    assert restored['current_room'] is hall
+    assert type(restored['inventory']) is Bag
+    assert restored['inventory'].find('lamp') is lamp
+    assert type(restored['path']) is tuple
+    assert snapshot(restored, objects) == data
+
+    try:
+        snapshot({'room': Room('attic')}, objects)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError('snapshot saved an object with no name')
+    try:
+        restore(b'XXXX' + data[4:], objects)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('restore accepted bad magic')